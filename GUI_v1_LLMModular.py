@@ -1,64 +1,97 @@
-import pandas as pd
 import streamlit as st
 import os
 import warnings
-from helpers.pdf_text_extractor import extract_feedback_from_pdf
+from helpers.ingestion import load_feedback_upload
+from helpers.pdf_text_extractor import extract_feedback_from_pdfs
 from helpers.processFeedbak import process_and_display_feedback
+from helpers.llm_processor import get_ollama_pool, warm_up_endpoints, model_name, llm_warm_up
+from helpers.semester_jobs import submit_semester_job, display_semester_job_status
+from helpers.sentiment_cube import display_department_overview
+from helpers.utils import cache_max_entries, cache_ttl_seconds
 warnings.filterwarnings("ignore")
 
 
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner=False)
+def extract_feedback_from_pdf_uploads(named_pdfs):
+    # named_pdfs is a tuple of (bytes, file name); the faculty name is taken from the file name
+    return extract_feedback_from_pdfs(list(named_pdfs))
+
+
 # =========================================
 # Streamlit UI Starts
 # =========================================
 
-st.set_page_config(layout="wide")
 
-st.markdown("""
+def main():
+    st.set_page_config(layout="wide")
+
+    # Hosts idle past the keep-alive start loading the model while a file and a teacher are being picked
+    if llm_warm_up:
+        warm_up_endpoints(get_ollama_pool(), model_name)
+
+    st.markdown("""
 <style>
   .block-container { padding-top: 1rem; padding-bottom: 1rem; }
   .center-title { text-align: center; }
 </style>
 """, unsafe_allow_html=True)
 
-st.markdown("<h1 class='center-title'>Teacher Feedback Analysis Dashboard</h1>", unsafe_allow_html=True)
-
-columns = ['FacultyName', 'Course', 'Comments', 'Target', 'Class']
-columns_str = ", ".join(f"**{col}**" for col in columns)
-aspect_categories = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
-
-input_mode = st.radio("Select Input Mode", ["Multiple Teachers (CSV/XLSX)", "Individual Teacher (PDF)"])
-
-if input_mode == "Multiple Teachers (CSV/XLSX)":
-    st.markdown(f"\n 📁 Upload **CSV or Excel** file with columns: {columns_str}")
-    uploaded_file = st.file_uploader("Upload file", type=["csv", "xlsx"], label_visibility="collapsed")
-
-    if uploaded_file:
-        df = pd.read_excel(uploaded_file) if uploaded_file.name.endswith('.xlsx') else pd.read_csv(uploaded_file)
-        df = df[df['Target'].str.contains('Teacher', case=False, na=False)]
-
-        semester_name = os.path.splitext(uploaded_file.name)[0]
-        teachers = sorted(df['FacultyName'].dropna().unique())
-
-        selected_teacher = st.sidebar.selectbox("Select a Teacher", teachers)
-        if selected_teacher:
-            process_and_display_feedback(df, selected_teacher, semester_name)
-
-elif input_mode == "Individual Teacher (PDF)":
-    pdf_file = st.file_uploader("Upload PDF", type="pdf")
-    if pdf_file:
-        with st.spinner("Extracting feedback from PDF..."):
-            df = extract_feedback_from_pdf(pdf_file)
-            df.to_csv("temp.csv", index=False)  # Save the extracted data for debugging
-        if not df.empty:
-            teacher_dfRaw = df[df['Target'].str.contains('Teacher', case=False, na=False)]
-            selected_teacher = teacher_dfRaw['FacultyName'].iloc[0]                    
-            # selected_course = teacher_dfRaw['Course'].iloc[0]
-            # selected_class = teacher_dfRaw['Class'].iloc[0]
-            semester_name = teacher_dfRaw['Semester'].iloc[0] if 'Semester' in teacher_dfRaw.columns else "Individual Teacher"
-
-            st.sidebar.markdown(f"**Teacher:** {selected_teacher}")
-            # st.sidebar.markdown(f"**Course:** {selected_course}")
-            # st.sidebar.markdown(f"**Class:** {selected_class}")
-            # st.sidebar.markdown(f"**Semester:** {semester_name}")
-            
-            process_and_display_feedback(teacher_dfRaw, selected_teacher, semester_name)
+    st.markdown("<h1 class='center-title'>Teacher Feedback Analysis Dashboard</h1>", unsafe_allow_html=True)
+
+    columns = ['FacultyName', 'Course', 'Comments', 'Target', 'Class']
+    columns_str = ", ".join(f"**{col}**" for col in columns)
+    aspect_categories = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
+
+    input_mode = st.radio("Select Input Mode", ["Multiple Teachers (CSV/XLSX)", "Individual Teacher (PDF)"])
+
+    if input_mode == "Multiple Teachers (CSV/XLSX)":
+        st.markdown(f"\n 📁 Upload **CSV or Excel** file with columns: {columns_str}")
+        uploaded_file = st.file_uploader("Upload file", type=["csv", "xlsx"], label_visibility="collapsed")
+
+        if uploaded_file:
+            try:
+                df = load_feedback_upload(uploaded_file.getvalue(), uploaded_file.name)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+
+            semester_name = os.path.splitext(uploaded_file.name)[0]
+            teachers = sorted(df['FacultyName'].dropna().unique())
+
+            if st.sidebar.button("Process whole semester in background"):
+                if not submit_semester_job(df, semester_name, aspect_categories):
+                    st.sidebar.info("A background job for this semester is already running.")
+            display_semester_job_status(semester_name)
+            display_department_overview(semester_name, aspect_categories, teacher_count=len(teachers))
+
+            selected_teacher = st.sidebar.selectbox("Select a Teacher", teachers)
+            if selected_teacher:
+                process_and_display_feedback(df, selected_teacher, semester_name)
+
+    elif input_mode == "Individual Teacher (PDF)":
+        pdf_files = st.file_uploader("Upload PDF", type="pdf", accept_multiple_files=True)
+        if pdf_files:
+            with st.spinner(f"Extracting feedback from {len(pdf_files)} PDF(s)..."):
+                df = extract_feedback_from_pdf_uploads(tuple((pdf_file.getvalue(), pdf_file.name) for pdf_file in pdf_files))
+                df.to_csv("temp.csv", index=False)  # Save the extracted data for debugging
+            if not df.empty:
+                df = df[df['Target'].str.contains('Teacher', case=False, na=False)]
+                teachers = sorted(df['FacultyName'].dropna().unique())
+                selected_teacher = st.sidebar.selectbox("Select a Teacher", teachers)
+                teacher_dfRaw = df[df['FacultyName'] == selected_teacher]
+                # selected_course = teacher_dfRaw['Course'].iloc[0]
+                # selected_class = teacher_dfRaw['Class'].iloc[0]
+                semester_name = teacher_dfRaw['Semester'].iloc[0] if 'Semester' in teacher_dfRaw.columns else "Individual Teacher"
+
+                st.sidebar.markdown(f"**Teacher:** {selected_teacher}")
+                # st.sidebar.markdown(f"**Course:** {selected_course}")
+                # st.sidebar.markdown(f"**Class:** {selected_class}")
+                # st.sidebar.markdown(f"**Semester:** {semester_name}")
+
+                process_and_display_feedback(teacher_dfRaw, selected_teacher, semester_name)
+
+
+# Process pools and the semester worker use spawn, which imports this script again as "__mp_main__" in every
+# worker; the guard keeps the page and the warm-up out of those processes
+if __name__ == "__main__":
+    main()
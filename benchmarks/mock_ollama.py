@@ -0,0 +1,179 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.synthetic_data import ASPECT_PHRASES
+from helpers.ollama_pool import parse_keep_alive
+
+# =========================================
+# Local stand-in for the Ollama /api/chat endpoint
+# =========================================
+# Answers ABSA prompts by looking up the phrases the synthetic generator writes, with a configurable
+# latency and a share of replies that cannot be parsed, so the pipeline can be timed without a GPU box.
+# Like Ollama, it "loads the model" on the first request and unloads it once keep_alive has passed.
+
+BATCH_PREFIX = "Analyze each of the following reviews separately."
+
+
+def absa_result(review):
+    review = review.lower()
+    result = {}
+    for aspect, phrases in ASPECT_PHRASES.items():
+        found = [(phrase, polarity) for phrase, polarity in phrases if phrase in review]
+        if found:
+            result[aspect] = {"Aspect Terms": [phrase for phrase, _ in found], "Polarity": found[0][1]}
+        else:
+            result[aspect] = {"Aspect Terms": None, "Polarity": None}
+    return result
+
+
+def malformed_reply(rng, reply):
+    # The ways a small model breaks the format: cut off mid-object, or prose instead of JSON
+    if rng.random() < 0.5:
+        return reply[:max(1, len(reply) // 2)]
+    return "I'm sorry, I could not identify any aspects in this review."
+
+
+def chat_reply(user_content, rng, malformed_rate, structured=False):
+    if user_content.startswith(BATCH_PREFIX):
+        reviews = json.loads(user_content[user_content.index("["):])
+        reply = json.dumps({item["id"]: absa_result(item["review"]) for item in reviews}, indent=2)
+    else:
+        reply = json.dumps(absa_result(user_content), indent=2)
+    if rng.random() < malformed_rate:
+        return malformed_reply(rng, reply), True
+    if structured:
+        # With a `format` schema Ollama returns the bare object
+        return reply, False
+    # Models like to wrap the object in a fenced block
+    return f"```json\n{reply}\n```", False
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_body(200, json.dumps({"models": [{"name": self.server.model_name}]}))
+        else:
+            self.send_body(200, "Ollama is running", "text/plain")
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_body(404, "404 page not found", "text/plain")
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        user_content = body["messages"][-1]["content"]
+        keep_alive = parse_keep_alive(body.get("keep_alive", "5m"))
+        with server.lock:
+            reply, malformed = chat_reply(user_content, server.rng, server.malformed_rate, structured="format" in body)
+            server.stats["requests"] += 1
+            server.stats["batched"] += user_content.startswith(BATCH_PREFIX)
+            server.stats["malformed"] += malformed
+            now = time.monotonic()
+            if now >= server.unload_at and now >= server.ready_at:
+                # Model not in memory: every request waits until it is loaded
+                server.ready_at = now + server.load_latency
+                server.stats["loads"] += 1
+            server.unload_at = max(server.unload_at, server.ready_at + keep_alive)
+            load_wait = max(0.0, server.ready_at - now)
+        if body.get("options", {}).get("num_predict"):
+            reply = reply[:4 * body["options"]["num_predict"]]
+
+        start = time.perf_counter()
+        time.sleep(load_wait + server.latency)
+        # Roughly one token per four characters of output
+        eval_count = max(1, len(reply) // 4)
+        metrics = {
+            "prompt_eval_count": sum(len(m["content"]) for m in body["messages"]) // 4,
+            "eval_count": eval_count,
+            "load_duration": int(load_wait * 1e9),
+        }
+
+        if not body.get("stream", True):
+            time.sleep(server.token_latency * eval_count)
+            duration = int((time.perf_counter() - start) * 1e9)
+            self.send_body(200, json.dumps({
+                "model": body.get("model"), "message": {"role": "assistant", "content": reply}, "done": True,
+                "total_duration": duration, "eval_duration": duration, **metrics,
+            }))
+            return
+
+        # NDJSON chunks like Ollama's streaming mode; the client may hang up before "done"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for pos in range(0, len(reply), 4):
+                time.sleep(server.token_latency)
+                self.write_chunk({"model": body.get("model"), "message": {"role": "assistant", "content": reply[pos:pos + 4]}, "done": False})
+            duration = int((time.perf_counter() - start) * 1e9)
+            self.write_chunk({
+                "model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done": True,
+                "total_duration": duration, "eval_duration": duration, **metrics,
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            with server.lock:
+                server.stats["cancelled"] += 1
+            self.close_connection = True
+
+    def write_chunk(self, chunk):
+        data = (json.dumps(chunk) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(port=0, latency=0.05, token_latency=0.0, malformed_rate=0.0, seed=0, model_name="gemma2:2b",
+                      load_latency=0.0):
+    """Serve the mock endpoint from a daemon thread; the URL is http://127.0.0.1:<server.server_port>."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.load_latency = load_latency
+    server.ready_at = 0.0
+    server.unload_at = 0.0
+    server.token_latency = token_latency
+    server.malformed_rate = malformed_rate
+    server.model_name = model_name
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "batched": 0, "malformed": 0, "cancelled": 0, "loads": 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.mock_ollama --port 11434 --latency 0.3 --malformed-rate 0.05
+    parser = argparse.ArgumentParser(description="Run a mock Ollama /api/chat server.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per streamed chunk")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of replies that are not valid JSON")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Seconds to load the model after it was unloaded")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_mock_server(args.port, args.latency, args.token_latency, args.malformed_rate, args.seed,
+                               load_latency=args.load_latency)
+    print(f"Mock Ollama listening on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,295 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import logging
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.synthetic_data import generate_feedback, write_feedback_pdf
+from benchmarks.mock_ollama import start_mock_server, chat_reply
+
+# =========================================
+# Timed pipeline scenarios against synthetic data and the mock Ollama server
+# =========================================
+# Everything runs inside a scratch directory, so the Datasets/, Reports/ and cache files of the app are
+# never touched. Each run writes one JSON report; pass an earlier one as --baseline to see the change.
+
+aspect_categories = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
+
+
+def time_runs(func, repeat):
+    """Call func `repeat` times; returns the seconds of every run and the last return value."""
+    runs = []
+    result = None
+    # The pipeline prints every reply it cannot parse; keep that out of the benchmark output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            runs.append(time.perf_counter() - start)
+    return runs, result
+
+
+def summarize(runs, **extra):
+    return {"seconds": statistics.median(runs), "min_seconds": min(runs), "runs": runs, **extra}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_workdir(workdir, endpoint_urls):
+    # The app reads the Ollama hosts from st.secrets; point it at the mock servers for this run only
+    os.makedirs(os.path.join(workdir, ".streamlit"), exist_ok=True)
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f"OLLAMA_ENDPOINTS = {json.dumps(endpoint_urls)}\n")
+    os.chdir(workdir)
+
+
+def run_scenarios(args, workdir):
+    # Imported only now: llm_processor reads st.secrets from the scratch directory at import time
+    # Outside "streamlit run" every st.* call logs a warning about the missing script context
+    logging.disable(logging.WARNING)
+    from helpers.utils import parse_json_safe
+    from helpers.absa_schema import parse_absa_response
+    from helpers import llm_processor, graph_generator, wordcloud_engine
+    from helpers.aspect_masks import add_aspect_masks
+    from helpers.pdf_text_extractor import extract_feedback_from_pdf
+    from helpers.report_builder import build_absa_report_pdf
+    from helpers.telemetry import Telemetry
+    from helpers import sentiment_cube
+    from helpers.ingestion import read_feedback_csv
+
+    def build_semester_cube(results_df):
+        return sentiment_cube.index_cube(sentiment_cube.build_cube(results_df))
+
+    scenarios = {}
+    raw_df = generate_feedback(args.rows, seed=args.seed)
+
+    # Reading an upload: everything then filtering, against pruned, typed, chunked reading
+    export_df = raw_df.assign(**{f"Q{num}": num for num in range(10)})
+    csv_bytes = export_df.to_csv(index=False).encode("utf-8")
+
+    def read_full():
+        full_df = pd.read_csv(io.BytesIO(csv_bytes))
+        return full_df[full_df['Target'].str.contains('Teacher', case=False, na=False)]
+
+    runs, full_df = time_runs(read_full, args.repeat)
+    scenarios["read_upload_full"] = summarize(runs, memory_mb=full_df.memory_usage(deep=True).sum() / 1e6)
+    runs, pruned_df = time_runs(lambda: read_feedback_csv(io.BytesIO(csv_bytes)), args.repeat)
+    scenarios["read_upload_pruned"] = summarize(runs, memory_mb=pruned_df.memory_usage(deep=True).sum() / 1e6)
+
+    df = raw_df[raw_df['Target'].str.contains('Teacher', case=False, na=False)]
+    # The teacher with the most comments stands in for one dashboard run
+    selected_teacher = df['FacultyName'].value_counts().index[0]
+    teacher_dfRaw = df[df['FacultyName'] == selected_teacher].head(args.llm_comments)
+    print(f"{len(df)} teacher comments generated; timing {selected_teacher} with {len(teacher_dfRaw)} comments")
+
+    # parse_json_safe over the same mix of replies the mock server sends
+    rng = random.Random(args.seed)
+    replies = [chat_reply(comment, rng, args.malformed_rate)[0] for comment in df['Comments'].head(args.parse_count)]
+    runs, parsed = time_runs(lambda: [parse_json_safe(reply) for reply in replies], args.repeat)
+    scenarios["parse_json_safe"] = summarize(
+        runs, replies=len(replies), usec_per_reply=statistics.median(runs) / len(replies) * 1e6,
+        parse_failures=sum(result is None for result in parsed),
+    )
+    # The strict parser over the bare objects a schema-constrained reply contains
+    rng = random.Random(args.seed)
+    replies = [chat_reply(comment, rng, args.malformed_rate, structured=True)[0] for comment in df['Comments'].head(args.parse_count)]
+    runs, parsed = time_runs(lambda: [parse_absa_response(reply, aspect_categories) for reply in replies], args.repeat)
+    scenarios["parse_absa_response"] = summarize(
+        runs, replies=len(replies), usec_per_reply=statistics.median(runs) / len(replies) * 1e6,
+        parse_failures=sum(result is None for result, _ in parsed),
+    )
+
+    # Loading the model on every host, as the dashboard does at startup; the LLM scenarios then run warm
+    telemetry = Telemetry()
+    def warm_up():
+        for thread in llm_processor.warm_up_endpoints(llm_processor.get_ollama_pool(), llm_processor.model_name, telemetry=telemetry):
+            thread.join()
+    runs, _ = time_runs(warm_up, 1)
+    scenarios["llm_warm_up"] = summarize(runs, llm=telemetry.llm_summary())
+
+    # The LLM stage with an empty cache, again with a warm cache, and with batched prompts
+    def process(batch_size, telemetry):
+        return llm_processor.process_teacher_feedback_with_llm(
+            teacher_dfRaw.copy(), selected_teacher, "benchmark", aspect_categories,
+            max_workers=args.concurrency, batch_size=batch_size, telemetry=telemetry,
+        )
+
+    for name, batch_size, clear_cache in [
+        ("llm_cold_cache", 1, True), ("llm_warm_cache", 1, False), ("llm_batched", args.batch_size, True),
+    ]:
+        if clear_cache:
+            llm_processor.get_llm_cache().clear()
+        shutil.rmtree(os.path.join("Datasets", "benchmark"), ignore_errors=True)
+        telemetry = Telemetry()
+        runs, teacher_df = time_runs(lambda: process(batch_size, telemetry), 1)
+        scenarios[name] = summarize(
+            runs, comments=len(teacher_dfRaw), batch_size=batch_size,
+            comments_per_second=len(teacher_dfRaw) / runs[0], llm=telemetry.llm_summary(),
+        )
+
+    teacher_df = add_aspect_masks(teacher_df, aspect_categories)
+
+    # Chart and word clouds as the dashboard draws them, first uncached and then from the caches
+    def cold_bar_chart():
+        graph_generator.build_bar_chart_figure.clear()
+        return graph_generator.generate_bar_chart(teacher_df, aspect_categories)
+
+    runs, fig = time_runs(cold_bar_chart, args.repeat)
+    # What the browser receives for the chart
+    scenarios["bar_chart_cold"] = summarize(runs, payload_kb=len(fig.to_json()) / 1024)
+    runs, _ = time_runs(lambda: graph_generator.generate_bar_chart(teacher_df, aspect_categories), args.repeat)
+    scenarios["bar_chart_warm"] = summarize(runs)
+
+    # Chart counts for every course and class of the teacher: filtering the rows each time versus the cube
+    selections = [(course, "All") for course in teacher_df['Course'].unique()] + [
+        (course, str(class_)) for course, class_ in teacher_df[['Course', 'Class']].drop_duplicates().itertuples(index=False)
+    ]
+
+    def counts_from_rows():
+        for course, class_ in selections:
+            rows = teacher_df[teacher_df['Course'] == course]
+            if class_ != "All":
+                rows = rows[rows['Class'].astype(str) == class_]
+            sentiment_cube.cube_chart_data(sentiment_cube.slice_cube(build_semester_cube(rows)), aspect_categories)
+
+    cube = build_semester_cube(teacher_df)
+    runs, _ = time_runs(counts_from_rows, args.repeat)
+    scenarios["filter_counts_rows"] = summarize(runs, selections=len(selections))
+    runs, _ = time_runs(lambda: [sentiment_cube.cube_chart_data(sentiment_cube.slice_cube(cube, selected_teacher, course, class_),
+                                                                aspect_categories) for course, class_ in selections], args.repeat)
+    scenarios["filter_counts_cube"] = summarize(runs, selections=len(selections))
+
+    wordcloud_root = os.path.join(workdir, "wordclouds")
+
+    def cold_wordcloud():
+        wordcloud_engine.wordcloud_cache_dir = tempfile.mkdtemp(dir=wordcloud_root)
+        return graph_generator.generate_wordcloud(teacher_df, aspect_categories)
+
+    os.makedirs(wordcloud_root, exist_ok=True)
+    runs, _ = time_runs(cold_wordcloud, args.repeat)
+    scenarios["wordcloud_cold"] = summarize(runs)
+    runs, _ = time_runs(lambda: graph_generator.generate_wordcloud(teacher_df, aspect_categories), args.repeat)
+    scenarios["wordcloud_warm"] = summarize(runs)
+
+    # Text extraction from a generated teacher PDF
+    pdf_path = write_feedback_pdf(df[df['FacultyName'] == selected_teacher], os.path.join(workdir, f"{selected_teacher}.pdf"))
+
+    def extract():
+        with open(pdf_path, "rb") as pdf_file:
+            return extract_feedback_from_pdf(pdf_file)
+
+    runs, extracted = time_runs(extract, args.repeat)
+    scenarios["extract_feedback_from_pdf"] = summarize(runs, rows=len(extracted))
+
+    # Full PDF report, including the chart image export
+    graph_generator.image_export_dir = os.path.join(workdir, "images")
+    runs, pdf_bytes = time_runs(
+        lambda: build_absa_report_pdf(teacher_df, selected_teacher, "All", "All", aspect_categories), args.repeat
+    )
+    scenarios["pdf_report"] = summarize(runs, pdf_kb=len(pdf_bytes) / 1024)
+    return scenarios, llm_processor.get_ollama_pool().snapshot()
+
+
+def compare_reports(report, baseline):
+    print(f"\n{'scenario':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>12}{result['seconds']:>11.3f}s{'new':>10}")
+            continue
+        change = (result["seconds"] - before["seconds"]) / before["seconds"] if before["seconds"] else 0.0
+        print(f"{name:<28}{before['seconds']:>11.3f}s{result['seconds']:>11.3f}s{change:>+10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the feedback pipeline on synthetic data against a mock Ollama server.")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows of synthetic feedback to generate")
+    parser.add_argument("--llm-comments", type=int, default=300, help="Comments sent through the LLM scenarios")
+    parser.add_argument("--parse-count", type=int, default=5000, help="Replies parsed by each parser scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Mock server seconds per streamed chunk")
+    parser.add_argument("--malformed-rate", type=float, default=0.02, help="Share of mock replies that are not valid JSON")
+    parser.add_argument("--load-latency", type=float, default=1.0, help="Mock server seconds to load the model")
+    parser.add_argument("--hosts", type=int, default=1, help="Mock Ollama servers to route over")
+    parser.add_argument("--slow-host-latency", type=float, default=None, help="Latency of one extra, slow mock server")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM requests in flight")
+    parser.add_argument("--batch-size", type=int, default=5, help="Comments per request in the batched scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each non-LLM scenario; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    created = datetime.now(timezone.utc)
+    output = os.path.abspath(args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"benchmark_{created.strftime('%Y%m%d_%H%M%S')}.json"
+    ))
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    servers = [
+        start_mock_server(latency=args.latency, token_latency=args.token_latency,
+                          malformed_rate=args.malformed_rate, seed=args.seed + num, load_latency=args.load_latency)
+        for num in range(args.hosts)
+    ]
+    if args.slow_host_latency is not None:
+        servers.append(start_mock_server(latency=args.slow_host_latency, token_latency=args.token_latency,
+                                         malformed_rate=args.malformed_rate, seed=args.seed + len(servers),
+                                         load_latency=args.load_latency))
+    workdir = tempfile.mkdtemp(prefix="feedback_benchmark_")
+    cwd = os.getcwd()
+    try:
+        prepare_workdir(workdir, [f"http://127.0.0.1:{server.server_port}" for server in servers])
+        scenarios, endpoints = run_scenarios(args, workdir)
+    finally:
+        os.chdir(cwd)
+        for server in servers:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": created.isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "mock_servers": [server.stats for server in servers],
+        "endpoints": endpoints,
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in scenarios.items():
+        print(f"{name:<28}{result['seconds']:>9.3f}s")
+    print(f"Report written to {output}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.run_benchmarks [--rows 100000] [--baseline benchmarks/results/<earlier>.json]
+    main()
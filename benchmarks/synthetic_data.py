@@ -0,0 +1,127 @@
+import random
+import argparse
+import pandas as pd
+from fpdf import FPDF
+
+# =========================================
+# Synthetic student feedback, shaped like temp.csv
+# =========================================
+
+# (phrase, polarity) per aspect; the mock Ollama server finds these same phrases in a review
+ASPECT_PHRASES = {
+    "Teaching Skills": [
+        ("explains concepts clearly", "Positive"), ("great teaching method", "Positive"),
+        ("engaging lectures", "Positive"), ("teaching is too fast", "Negative"),
+        ("lectures are boring", "Negative"), ("uses slides", "Neutral"),
+    ],
+    "Knowledge": [
+        ("deep knowledge of the subject", "Positive"), ("very knowledgeable", "Positive"),
+        ("mastery of programming", "Positive"), ("lacks subject knowledge", "Negative"),
+        ("knows the basics", "Neutral"),
+    ],
+    "Fair in Assessment": [
+        ("fair in grading", "Positive"), ("marks are fair", "Positive"),
+        ("unfair marking", "Negative"), ("quizzes are too hard", "Negative"),
+        ("takes regular quizzes", "Neutral"),
+    ],
+    "Experience": [
+        ("very experienced", "Positive"), ("shares industry experience", "Positive"),
+        ("new to teaching", "Negative"), ("has some experience", "Neutral"),
+    ],
+    "Behavior": [
+        ("very humble", "Positive"), ("friendly and cooperative", "Positive"),
+        ("always punctual", "Positive"), ("rude to students", "Negative"),
+        ("often late", "Negative"), ("strict but polite", "Neutral"),
+    ],
+}
+
+# Short answers students repeat word for word, including the placeholders the pre-filter skips
+REPEATED_COMMENTS = [
+    "good", "very good teacher", "excellent teacher", "best teacher", "no comments", "nil", "n/a",
+    "good course", "okay", "she is a good teacher", "great teaching", "very nice teacher",
+]
+
+OPENINGS = ["", "the teacher ", "mam ", "sir ", "she is ", "he is ", "our instructor is "]
+JOINERS = [", ", " and ", ". ", "; "]
+ENDINGS = ["", ".", " overall.", " in the class.", " throughout the semester."]
+
+COURSE_NAMES = [
+    "Programming Fundamentals (Th)", "Programming Fundamentals (Lab)", "Data Structures (Th)",
+    "Database Systems (Th)", "Operating Systems (Th)", "Computer Networks (Th)",
+    "Discrete Structures (Th)", "Calculus and Analytical Geometry (Th)", "Software Engineering (Th)",
+    "Artificial Intelligence (Th)", "Technical and Business Writing (Th)", "Linear Algebra (Th)",
+]
+CLASS_NAMES = ["cs1h", "cs1l", "cs2h", "cs3h", "cs3l", "se1h", "se2h", "ai1h", "ds2h"]
+
+
+def make_comment(rng, repeat_rate=0.3):
+    if rng.random() < repeat_rate:
+        return rng.choice(REPEATED_COMMENTS)
+    aspects = rng.sample(list(ASPECT_PHRASES), rng.choice([1, 1, 2, 2, 3]))
+    phrases = [rng.choice(ASPECT_PHRASES[aspect])[0] for aspect in aspects]
+    text = rng.choice(OPENINGS) + phrases[0]
+    for phrase in phrases[1:]:
+        text += rng.choice(JOINERS) + phrase
+    return text + rng.choice(ENDINGS)
+
+
+def generate_feedback(rows, teachers=None, seed=0, semester="fall 2024", teacher_share=0.6):
+    """Return a dataframe of `rows` feedback rows with the FacultyName, Course, Comments, Target, Class, Semester columns."""
+    rng = random.Random(seed)
+    teachers = teachers or max(1, rows // 300)
+    teacher_names = [f"TEACHER {num:03d} ({num % 3 + 1})" for num in range(1, teachers + 1)]
+    # Every teacher teaches two or three sections, each with a fixed course code
+    sections = {
+        name: [
+            (f"{rng.choice(COURSE_NAMES)}  {rng.randint(3000, 3999)}", rng.choice(CLASS_NAMES))
+            for _ in range(rng.randint(2, 3))
+        ]
+        for name in teacher_names
+    }
+    records = []
+    for _ in range(rows):
+        name = rng.choice(teacher_names)
+        course, class_name = rng.choice(sections[name])
+        records.append({
+            "FacultyName": name,
+            "Course": course,
+            "Comments": make_comment(rng),
+            "Target": "Teacher" if rng.random() < teacher_share else "Course",
+            "Class": class_name,
+            "Semester": semester,
+        })
+    return pd.DataFrame(records, columns=["FacultyName", "Course", "Comments", "Target", "Class", "Semester"])
+
+
+def write_feedback_pdf(teacher_df, path):
+    """Write one teacher's rows in the layout of the university feedback PDFs read by extract_feedback_from_pdf."""
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.set_font("Arial", size=9)
+    pdf.add_page()
+    pdf.cell(0, 5, "Student Feedback Report", ln=1)
+    for (course, class_name, semester), block_df in teacher_df.groupby(["Course", "Class", "Semester"], sort=False):
+        pdf.cell(0, 5, f"Term: {semester} Class: {class_name}", ln=1)
+        pdf.cell(0, 5, course, ln=1)
+        pdf.cell(0, 5, "Comments For Teacher and Course", ln=1)
+        for comment, target in zip(block_df["Comments"], block_df["Target"]):
+            pdf.cell(0, 5, f"For {target} {comment}", ln=1)
+    pdf.output(path)
+    return path
+
+
+if __name__ == "__main__":
+    # Usage: python -m benchmarks.synthetic_data --rows 100000 --output synthetic_feedback.csv
+    parser = argparse.ArgumentParser(description="Generate synthetic student feedback.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--teachers", type=int, default=None, help="Number of teachers (default: one per 300 rows)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic_feedback.csv", help=".csv or .xlsx")
+    args = parser.parse_args()
+
+    df = generate_feedback(args.rows, args.teachers, args.seed)
+    if args.output.endswith(".xlsx"):
+        df.to_excel(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} rows for {df['FacultyName'].nunique()} teachers to {args.output}")
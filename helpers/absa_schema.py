@@ -0,0 +1,64 @@
+import json
+
+# =========================================
+# Structured ABSA output
+# =========================================
+# The JSON schema is sent as Ollama's `format` parameter, so the model can only produce an object with one
+# entry per selected aspect. Replies are then parsed strictly: anything that is not valid JSON matching the
+# schema is rejected with a reason and re-asked, instead of being patched up with regular expressions.
+
+POLARITIES = ["Positive", "Negative", "Neutral"]
+
+
+def build_aspect_schema():
+    return {
+        "type": "object",
+        "properties": {
+            "Aspect Terms": {"type": ["array", "null"], "items": {"type": "string"}},
+            "Polarity": {"type": ["string", "null"], "enum": POLARITIES + [None]},
+        },
+        "required": ["Aspect Terms", "Polarity"],
+    }
+
+
+def build_absa_schema(aspects):
+    return {
+        "type": "object",
+        "properties": {aspect: build_aspect_schema() for aspect in aspects},
+        "required": list(aspects),
+    }
+
+
+def build_batch_schema(aspects, count):
+    # Batched prompts answer with one result per review id, "1" to count
+    review_schema = build_absa_schema(aspects)
+    ids = [str(num) for num in range(1, count + 1)]
+    return {"type": "object", "properties": {review_id: review_schema for review_id in ids}, "required": ids}
+
+
+def absa_validation_error(result_dict, aspects):
+    """Return why a parsed reply does not match the schema, or None when it does."""
+    if not isinstance(result_dict, dict):
+        return "reply is not a JSON object"
+    for aspect in aspects:
+        aspect_data = result_dict.get(aspect)
+        if not isinstance(aspect_data, dict):
+            return f"'{aspect}' is missing or not an object"
+        terms = aspect_data.get("Aspect Terms")
+        if terms is not None and not (isinstance(terms, list) and all(isinstance(term, str) for term in terms)):
+            return f"'{aspect}' terms are not a list of strings"
+        if aspect_data.get("Polarity") not in POLARITIES + [None]:
+            return f"'{aspect}' polarity {aspect_data.get('Polarity')!r} is not one of {POLARITIES}"
+    return None
+
+
+def parse_absa_response(response_text, aspects):
+    """Parse a schema-constrained reply; return (result_dict, None) or (None, reason)."""
+    try:
+        result_dict = json.loads(response_text)
+    except (TypeError, ValueError) as e:
+        return None, f"reply is not valid JSON: {e}"
+    error = absa_validation_error(result_dict, aspects)
+    if error is not None:
+        return None, error
+    return result_dict, None
@@ -0,0 +1,41 @@
+# =========================================
+# Vectorized masks shared by the LLM pre-filter, charts, word clouds and the PDF
+# =========================================
+
+# Placeholder answers students type instead of a real comment (compared without dots and spaces)
+PLACEHOLDER_COMMENTS = {"na", "n/a", "nocomments", "nocomment", "noany", "none"}
+
+
+def skip_llm_mask(comments):
+    """True for comments that are empty, too short or a placeholder, so they are never sent to the LLM."""
+    stripped = comments.fillna("").astype(str).str.strip()
+    compact = stripped.str.lower().str.replace(".", "", regex=False).str.replace(" ", "", regex=False)
+    return (
+        comments.isna()
+        | stripped.str.fullmatch(r"[.\s]*")
+        | (stripped.str.len() < 8)
+        | compact.isin(PLACEHOLDER_COMMENTS)
+    )
+
+
+def aspect_mask_column(aspect):
+    return f"{aspect}_discussed"
+
+
+def compute_aspect_mask(teacher_df, aspect):
+    terms = teacher_df[f"{aspect}_terms"].fillna("").astype(str).str.strip()
+    return (terms != "") & (terms.str.lower() != "none")
+
+
+def add_aspect_masks(teacher_df, aspects):
+    """Store one boolean "aspect discussed" column per aspect so later stages never rescan the terms."""
+    for aspect in aspects:
+        teacher_df[aspect_mask_column(aspect)] = compute_aspect_mask(teacher_df, aspect)
+    return teacher_df
+
+
+def aspect_mask(teacher_df, aspect):
+    column = aspect_mask_column(aspect)
+    if column in teacher_df.columns:
+        return teacher_df[column]
+    return compute_aspect_mask(teacher_df, aspect)
@@ -0,0 +1,109 @@
+import os
+import time
+import zipfile
+import argparse
+import multiprocessing as mp
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from helpers.result_store import load_semester_results
+from helpers.aspect_masks import add_aspect_masks
+from helpers.report_builder import build_absa_report_pdf, report_path
+
+# =========================================
+# Headless export of every report of a semester
+# =========================================
+
+aspect_categories = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
+
+
+def list_report_jobs(results_df):
+    """Every teacher, teacher x course and teacher x course x class combination in the results."""
+    jobs = []
+    for teacher, teacher_df in results_df.groupby('FacultyName', observed=True):
+        jobs.append((teacher, 'All', 'All'))
+        for course, course_df in teacher_df.groupby('Course', observed=True):
+            jobs.append((teacher, course, 'All'))
+            for class_ in sorted(course_df['Class'].astype(str).unique()):
+                jobs.append((teacher, course, class_))
+    return jobs
+
+
+def slice_results(results_df, selected_teacher, selected_course, selected_class):
+    # Same filtering as the dashboard's course and class selectboxes
+    report_df = results_df[results_df['FacultyName'] == selected_teacher]
+    if selected_course != 'All':
+        report_df = report_df[report_df['Course'] == selected_course]
+        if selected_class != 'All':
+            report_df = report_df[report_df['Class'].astype(str) == selected_class]
+    return report_df
+
+
+def build_report_file(report_df, semester_name, selected_teacher, selected_course, selected_class, selected_aspects):
+    """Build and write one PDF; returns (path, seconds). Runs inside a pool worker."""
+    start = time.perf_counter()
+    pdf_path = report_path(semester_name, selected_teacher, selected_course, selected_class)
+    pdf_bytes = build_absa_report_pdf(report_df, selected_teacher, selected_course, selected_class, selected_aspects)
+    with open(pdf_path, "wb") as f:
+        f.write(pdf_bytes)
+    return pdf_path, time.perf_counter() - start
+
+
+def export_semester_reports(semester_name, selected_aspects=None, max_workers=None, zip_output=False):
+    """Write every report of a semester to Reports/<semester>/ and return one timing record per report."""
+    selected_aspects = list(selected_aspects or aspect_categories)
+    results_df = load_semester_results(semester_name)
+    if results_df is None:
+        raise FileNotFoundError(f"No processed results found for semester '{semester_name}'")
+    # Results imported from older runs may not carry every aspect
+    selected_aspects = [aspect for aspect in selected_aspects if f"{aspect}_terms" in results_df.columns]
+    results_df = add_aspect_masks(results_df, selected_aspects)
+    os.makedirs(os.path.join("Reports", semester_name), exist_ok=True)
+
+    timings = []
+    # spawn instead of fork so this is also safe to call from inside the Streamlit server
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = {}
+        for teacher, course, class_ in list_report_jobs(results_df):
+            report_df = slice_results(results_df, teacher, course, class_)
+            future = pool.submit(build_report_file, report_df, semester_name, teacher, course, class_, selected_aspects)
+            futures[future] = (teacher, course, class_)
+        for future in as_completed(futures):
+            teacher, course, class_ = futures[future]
+            record = {"FacultyName": teacher, "Course": course, "Class": class_}
+            try:
+                record["path"], record["seconds"] = future.result()
+            except Exception as e:
+                print(f"Report failed for {teacher} / {course} / {class_}: {e}")
+                record["path"], record["seconds"], record["error"] = None, None, str(e)
+            timings.append(record)
+
+    timings_df = pd.DataFrame(timings)
+    timings_df.to_csv(os.path.join("Reports", semester_name, "export_timings.csv"), index=False)
+
+    if zip_output:
+        zip_path = os.path.join("Reports", f"{semester_name}_reports.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+            for pdf_path in timings_df["path"].dropna():
+                bundle.write(pdf_path, os.path.relpath(pdf_path, "Reports"))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every teacher, course and class report of a semester.")
+    parser.add_argument("semester", help="Semester name, as used under Datasets/<semester>")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--aspects", nargs="+", default=None, help="Aspects to include (default: all)")
+    parser.add_argument("--zip", action="store_true", help="Also bundle the reports into Reports/<semester>_reports.zip")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    timings = export_semester_reports(args.semester, args.aspects, args.workers, args.zip)
+    for record in sorted(timings, key=lambda r: (r["FacultyName"], r["Course"], r["Class"])):
+        status = f"{record['seconds']:.2f}s" if record.get("path") else f"FAILED: {record['error']}"
+        print(f"{record['FacultyName']} | {record['Course']} | {record['Class']}: {status}")
+    print(f"{len(timings)} reports in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    # Usage: python -m helpers.bulk_reports <semester> [--workers N] [--aspects ...] [--zip]
+    main()
@@ -1,109 +1,161 @@
 import plotly.express as px
 import tempfile
-import pandas as pd
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import os
 import streamlit as st
-from wordcloud import WordCloud, STOPWORDS
-from helpers.utils import wrap_text
+from helpers.utils import cache_max_entries, cache_ttl_seconds
+from helpers.aspect_masks import aspect_mask
+from helpers.wordcloud_engine import render_wordclouds
+from helpers.sentiment_cube import build_cube, index_cube, slice_cube, cube_chart_data, total_responses
 
 # =========================================
 # Helper Functions for GRaph Generation
 # =========================================
 
-def generate_bar_chart(teacher_df, aspect_categories):
-    sentiment_types = ['Positive', 'Neutral', 'Negative']
-    sentiment_colors = {'Positive': '#4CAF50', 'Neutral': '#FFC107', 'Negative': '#F44336'}
-
-    sentiment_chart_data = []
-
-    for aspect in aspect_categories:
-        aspect_df = teacher_df[
-            teacher_df[f"{aspect}_terms"].fillna("").str.strip().pipe(lambda s: (s != "") & (s.str.lower() != "none"))
-        ]
-        for sentiment in sentiment_types:
-            filtered = aspect_df[aspect_df[f"{aspect}_polarity"] == sentiment]
-            sentiment_chart_data.append({
-                'Aspect': aspect,
-                'Sentiment': sentiment,
-                'Count': len(filtered),
-                'Percentage': (len(filtered) / len(aspect_df)) * 100 if len(aspect_df) > 0 else 0,
-                'Comments': filtered['Comments'].tolist(),
-                'Terms': filtered[f"{aspect}_terms"].tolist()
-            })
-
-    sentiment_df = pd.DataFrame(sentiment_chart_data)
-    sentiment_df['CommentsStr'] = sentiment_df['Comments'].apply(
-        lambda clist: "<br>".join(wrap_text(c.replace("\n", " "), 140) for c in clist)
+sentiment_colors = {'Positive': '#4CAF50', 'Neutral': '#FFC107', 'Negative': '#F44336'}
+comments_page_size = 20
+
+
+def style_bar_chart(fig):
+    fig.update_layout(
+        xaxis_title="Aspect Category",
+        yaxis_title="Number of Responses",
+        xaxis=dict(tickfont=dict(size=14)),  # <-- adjust font size here    
+        hoverlabel=dict(font_size=12, font_family="Arial", align='left'), 
+        dragmode = False
     )
+    return fig
+
+
+# Cached per distinct (dataframe, aspects, counts) so widget changes elsewhere on the page do not rebuild the figure.
+# Counts come from the semester's aspect x sentiment cube when the caller has it, else from the rows themselves.
+# The figure carries counts and percentages only; the comments behind a bar are fetched when it is clicked
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner=False)
+def build_bar_chart_figure(teacher_df, aspect_categories, counts=None):
+    if counts is None:
+        counts = slice_cube(index_cube(build_cube(teacher_df)))
+    sentiment_df = cube_chart_data(counts, aspect_categories)
     # st.table(sentiment_df[['Aspect', 'Sentiment', 'Count', 'Percentage']].style.format({'Percentage': '{:.1f}%'}))
     fig = px.bar(
         sentiment_df,
         x='Aspect',
         y='Count',
         color='Sentiment',
-        custom_data=['Percentage', 'CommentsStr'],
+        custom_data=['Sentiment'],
         text=sentiment_df['Percentage'].apply(lambda x: f"{x:.1f}%"),
         color_discrete_map=sentiment_colors,
         barmode='group',
-        title= f'Total Responses: {len(teacher_df)}; Click any bar to view related comments'
+        title= f'Total Responses: {total_responses(counts)}; Click any bar to view related comments'
     )
 
-    fig.update_traces(
-        hovertemplate=(
-            "Count: %{y}<br>"
-            "<b>Comments:</b><br>%{customdata[1]}"
-            "<extra></extra>"
-        )
+    fig.update_traces(hovertemplate="Count: %{y}<extra></extra>")
+    return style_bar_chart(fig)
+
+
+def build_counts_figure(sentiment_df, responses, title=None):
+    # Counts and percentages only, for charts over many teachers
+    fig = px.bar(
+        sentiment_df,
+        x='Aspect',
+        y='Count',
+        color='Sentiment',
+        text=sentiment_df['Percentage'].apply(lambda x: f"{x:.1f}%"),
+        color_discrete_map=sentiment_colors,
+        barmode='group',
+        title=title or f'Total Responses: {responses}'
     )
+    fig.update_traces(hovertemplate="Count: %{y}<extra></extra>")
+    return style_bar_chart(fig)
 
-    fig.update_layout(
-        xaxis_title="Aspect Category",
-        yaxis_title="Number of Responses",
-        xaxis=dict(tickfont=dict(size=14)),  # <-- adjust font size here    
-        hoverlabel=dict(font_size=12, font_family="Arial", align='left'), 
-        dragmode = False
+
+def build_trend_figure(trend_df, polarity):
+    # Share of one polarity per aspect and semester; a semester where an aspect had no such comment shows 0%
+    discussed = trend_df.groupby(["semester", "aspect"], observed=True)["discussed"].first()
+    selected = trend_df[trend_df["polarity"] == polarity].set_index(["semester", "aspect"])["count"]
+    share_df = (selected.reindex(discussed.index, fill_value=0) / discussed * 100).rename("Percentage").reset_index()
+    share_df["semester"] = share_df["semester"].astype(str)
+    fig = px.line(
+        share_df,
+        x="semester",
+        y="Percentage",
+        color="aspect",
+        markers=True,
+        category_orders={"semester": [str(name) for name in trend_df["semester"].cat.categories]},
+        title=f"{polarity} comments per aspect, by semester"
     )
-    st.plotly_chart(fig, use_container_width=True)    
-    bar_graph_path = os.path.join(tempfile.gettempdir(), "bar_graph.png")
-    fig.write_image(bar_graph_path)
+    fig.update_layout(xaxis_title="Semester", yaxis_title=f"% {polarity}", yaxis=dict(range=[0, 100]), dragmode=False)
+    return fig
+
+
+# Static export goes through kaleido, which keeps one renderer subprocess alive between calls.
+# A single background thread owns it, so exports never race and never block the page.
+_image_export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kaleido")
+image_export_dir = os.path.join(tempfile.gettempdir(), "feedback_report_images")
+
+
+def export_bar_chart_image(fig):
+    # Named after the figure content: concurrent sessions never overwrite each other's chart,
+    # and an unchanged chart is never exported twice
+    fig_hash = hashlib.sha256(fig.to_json().encode("utf-8")).hexdigest()[:32]
+    bar_graph_path = os.path.join(image_export_dir, f"bar_graph_{fig_hash}.png")
+    if not os.path.exists(bar_graph_path):
+        os.makedirs(image_export_dir, exist_ok=True)
+        tmp_path = bar_graph_path + f".{os.getpid()}.tmp.png"
+        fig.write_image(tmp_path)
+        os.replace(tmp_path, bar_graph_path)
     return bar_graph_path
 
+
+def submit_bar_chart_export(fig):
+    """Start the PNG export in the background; the returned future resolves to the image path."""
+    return _image_export_executor.submit(export_bar_chart_image, fig)
+
+
+def bar_comments(teacher_df, aspect, sentiment):
+    # Same rows the cube counts for this bar
+    discussed = teacher_df[aspect_mask(teacher_df, aspect)]
+    polarity = discussed[f"{aspect}_polarity"].astype(object).fillna("None").astype(str)
+    return discussed.loc[polarity == sentiment, 'Comments']
+
+
+def display_bar_comments(teacher_df, aspect, sentiment):
+    comments = bar_comments(teacher_df, aspect, sentiment)
+    st.markdown(f"**{aspect}: {sentiment} comments ({len(comments)})**")
+    if comments.empty:
+        return
+    pages = (len(comments) + comments_page_size - 1) // comments_page_size
+    page = 1
+    if pages > 1:
+        # Keyed on the bar, so clicking another bar starts again at page 1
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                               key=f"bar_comments_page_{aspect}_{sentiment}")
+    start = (page - 1) * comments_page_size
+    page_df = comments.iloc[start:start + comments_page_size].to_frame().reset_index(drop=True)
+    page_df.index = range(start + 1, start + len(page_df) + 1)
+    st.table(page_df)
+
+
+def generate_bar_chart(teacher_df, aspect_categories, counts=None):
+    fig = build_bar_chart_figure(teacher_df, aspect_categories, counts)
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun", selection_mode="points",
+                            key="absa_bar_chart")
+    points = event.selection.points if event else []
+    if points:
+        display_bar_comments(teacher_df, points[0]["x"], points[0]["customdata"][0])
+    return fig
+
 # Function to generate word clouds for each aspect
 def generate_wordcloud(teacher_df, aspect_categories):
-    # Word cloud generation
-    negation_words = {"not", "no", "never", "cannot", "can't", "doesn't", "won't", "don't", "didn't"}
-    custom_stopwords = set(STOPWORDS).difference(negation_words)
-
-    stopwords = custom_stopwords.union({
-        "teacher", "ma'am", "sir", "miss", "mr", "mam", "mrs", "teaches", "student", "teach",  
-        "classroom", "good", "us", "mentioned", "course", "subject", "class", "students",
-        "teaching", "semester", "faculty", "professor", "experience", "knowledge", "behavior", "pedagogy"
-    })        
-    wordcloud_images = []
-
-    for aspect in aspect_categories:
-        aspect_df = teacher_df[
-            teacher_df[f"{aspect}_terms"].fillna("").str.strip().pipe(lambda s: (s != "") & (s.str.lower() != "none"))
-        ]
-        # terms_data = aspect_df["Comments"].str.lower().dropna()
-        terms_data = aspect_df[f"{aspect}_terms"]
-        if not terms_data.empty:
-            combined_terms = " ".join(terms_data).lower().strip()
-            
-            # Check if there's at least one word after removing stopwords
-            filtered_words = [word for word in combined_terms.split() if word not in stopwords]           
-            if filtered_words:  # Proceed only if there are valid words
-                wordcloud = WordCloud(width=800, height=400, background_color='white', stopwords=stopwords).generate(" ".join(filtered_words))
-                wordcloud_images.append((aspect, wordcloud))
-
+    wordcloud_images = render_wordclouds(teacher_df, aspect_categories)
     rows = (len(wordcloud_images) + 2) // 3
     for i in range(rows):
         cols = st.columns(3)
         for j in range(3):
             idx = i * 3 + j
             if idx < len(wordcloud_images):
-                aspect, wc_img = wordcloud_images[idx]
+                aspect, wc_path = wordcloud_images[idx]
                 with cols[j]:
                     st.markdown(f"<h4 class='wordcloud-title'><b>{aspect}</b></h4>", unsafe_allow_html=True)
-                    st.image(wc_img.to_array(), use_container_width=True)
+                    st.image(wc_path, use_container_width=True)
     return wordcloud_images
@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import glob
+import sqlite3
+import threading
+import pandas as pd
+import streamlit as st
+from helpers.aspect_masks import aspect_mask
+from helpers.result_store import semester_store_path, import_legacy_semester
+
+# =========================================
+# Cross-semester history of processed feedback
+# =========================================
+# Every processed semester is copied into one SQLite database: a row per comment and a row per aspect it
+# discusses, both carrying semester, teacher and course, with indexes on each of them. Trend queries over many
+# semesters are then single indexed GROUP BYs. A result part is re-ingested only when its file has changed.
+
+history_db_path = "Datasets/history.sqlite"
+
+SEASONS = {"spring": 1, "summer": 2, "fall": 3, "autumn": 3, "winter": 4}
+
+
+def semester_sort_key(semester_name):
+    # "Spring 2024" < "Fall 2024" < "Spring 2025"; names without a year sort after, alphabetically
+    name = str(semester_name).lower()
+    year = re.search(r"(19|20)\d{2}", name)
+    season = next((order for word, order in SEASONS.items() if word in name), 0)
+    return (0, int(year.group(0)), season, name) if year else (1, 0, 0, name)
+
+
+class HistoryStore:
+    """SQLite store of every processed comment and its aspect polarities, across semesters."""
+
+    def __init__(self, db_path):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS parts (
+                semester TEXT,
+                part TEXT,
+                mtime REAL,
+                PRIMARY KEY (semester, part)
+            );
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY,
+                semester TEXT,
+                part TEXT,
+                teacher TEXT,
+                course TEXT,
+                class TEXT,
+                comment TEXT
+            );
+            CREATE TABLE IF NOT EXISTS aspect_polarity (
+                feedback_id INTEGER,
+                semester TEXT,
+                part TEXT,
+                teacher TEXT,
+                course TEXT,
+                aspect TEXT,
+                polarity TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_feedback_semester ON feedback(semester, part);
+            CREATE INDEX IF NOT EXISTS idx_feedback_teacher ON feedback(teacher, semester);
+            CREATE INDEX IF NOT EXISTS idx_feedback_course ON feedback(course, semester);
+            CREATE INDEX IF NOT EXISTS idx_aspect_semester ON aspect_polarity(semester, part, aspect, polarity);
+            CREATE INDEX IF NOT EXISTS idx_aspect_teacher ON aspect_polarity(teacher, aspect, semester, polarity);
+            CREATE INDEX IF NOT EXISTS idx_aspect_course ON aspect_polarity(course, aspect, semester, polarity);
+            CREATE INDEX IF NOT EXISTS idx_aspect_all ON aspect_polarity(aspect, semester, polarity);
+        """)
+        self._conn.commit()
+
+    # ----- ingestion -----
+
+    def _delete_part(self, semester_name, part_name):
+        for table in ("feedback", "aspect_polarity"):
+            self._conn.execute(f"DELETE FROM {table} WHERE semester = ? AND part = ?", (semester_name, part_name))
+        self._conn.execute("DELETE FROM parts WHERE semester = ? AND part = ?", (semester_name, part_name))
+
+    def ingest_part(self, semester_name, part_name, results_df, mtime=None):
+        """Replace everything stored for one result part (one teacher) of a semester."""
+        keys = results_df.reindex(columns=["FacultyName", "Course", "Class"]).astype(object).fillna("").astype(str)
+        comments = results_df["Comments"].astype(object).where(results_df["Comments"].notna(), None)
+        aspects = [col[:-len("_terms")] for col in results_df.columns if col.endswith("_terms")]
+        with self._lock:
+            self._delete_part(semester_name, part_name)
+            first_id = (self._conn.execute("SELECT MAX(id) FROM feedback").fetchone()[0] or 0) + 1
+            ids = range(first_id, first_id + len(results_df))
+            self._conn.executemany(
+                "INSERT INTO feedback VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(ids, [semester_name] * len(results_df), [part_name] * len(results_df),
+                    keys["FacultyName"], keys["Course"], keys["Class"], comments),
+            )
+            id_series = pd.Series(ids, index=results_df.index)
+            for aspect in aspects:
+                discussed = aspect_mask(results_df, aspect)
+                polarity = results_df.loc[discussed, f"{aspect}_polarity"].astype(object).fillna("None").astype(str)
+                self._conn.executemany(
+                    "INSERT INTO aspect_polarity VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((int(feedback_id), semester_name, part_name, teacher, course, aspect, value)
+                     for feedback_id, teacher, course, value in zip(
+                         id_series[discussed], keys.loc[discussed, "FacultyName"], keys.loc[discussed, "Course"], polarity)),
+                )
+            self._conn.execute("INSERT INTO parts VALUES (?, ?, ?)", (semester_name, part_name, mtime))
+            self._conn.commit()
+
+    def sync_semester(self, semester_name):
+        """Ingest the result parts of a semester that are new or changed since the last sync; returns how many."""
+        store = semester_store_path(semester_name)
+        part_files = {os.path.basename(path): path for path in glob.glob(os.path.join(store, "*.parquet"))}
+        with self._lock:
+            known = dict(self._conn.execute("SELECT part, mtime FROM parts WHERE semester = ?", (semester_name,)).fetchall())
+            # Teachers whose part was removed leave the history too
+            for part_name in set(known) - set(part_files):
+                self._delete_part(semester_name, part_name)
+            self._conn.commit()
+        changed = 0
+        for part_name, path in part_files.items():
+            mtime = os.path.getmtime(path)
+            if known.get(part_name) != mtime:
+                self.ingest_part(semester_name, part_name, pd.read_parquet(path), mtime)
+                changed += 1
+        return changed
+
+    def sync(self, semesters=None):
+        # Every semester under Datasets/ that has a result store
+        if semesters is None:
+            semesters = [os.path.basename(os.path.dirname(path)) for path in glob.glob(os.path.join("Datasets", "*", "results"))]
+        changed = {semester: self.sync_semester(semester) for semester in semesters}
+        if any(changed.values()):
+            # Refresh the planner statistics so department-wide queries pick the aspect index
+            with self._lock:
+                self._conn.execute("PRAGMA optimize")
+        return changed
+
+    # ----- trend queries -----
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def _filters(self, selected_teacher=None, selected_course=None):
+        clauses, params = [], []
+        if selected_teacher is not None:
+            clauses.append("teacher = ?")
+            params.append(selected_teacher)
+        if selected_course is not None:
+            clauses.append("course = ?")
+            params.append(selected_course)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def aspect_trend(self, aspects, selected_teacher=None, selected_course=None):
+        """Per semester and aspect: comments discussing it and the share of each polarity, oldest semester first."""
+        where, params = self._filters(selected_teacher, selected_course)
+        placeholders = ", ".join("?" for _ in aspects)
+        where += (" AND " if where else " WHERE ") + f"aspect IN ({placeholders})"
+        counts = self._query(
+            f"SELECT semester, aspect, polarity, COUNT(*) AS count FROM aspect_polarity{where} "
+            "GROUP BY semester, aspect, polarity", params + list(aspects),
+        )
+        if counts.empty:
+            return counts
+        counts["discussed"] = counts.groupby(["semester", "aspect"])["count"].transform("sum")
+        counts["percentage"] = counts["count"] / counts["discussed"] * 100
+        order = sorted(counts["semester"].unique(), key=semester_sort_key)
+        counts["semester"] = pd.Categorical(counts["semester"], categories=order, ordered=True)
+        return counts.sort_values(["semester", "aspect", "polarity"]).reset_index(drop=True)
+
+    def responses_by_semester(self, selected_teacher=None, selected_course=None):
+        where, params = self._filters(selected_teacher, selected_course)
+        responses = self._query(f"SELECT semester, COUNT(*) AS responses FROM feedback{where} GROUP BY semester", params)
+        return responses.sort_values("semester", key=lambda names: names.map(semester_sort_key)).reset_index(drop=True)
+
+    def courses(self, selected_teacher):
+        rows = self._query("SELECT DISTINCT course FROM feedback WHERE teacher = ? ORDER BY course", (selected_teacher,))
+        return rows["course"].tolist()
+
+    def close(self):
+        self._conn.close()
+
+
+_history_store = None
+
+
+# Shared by every Streamlit session of this server process
+def get_history_store():
+    global _history_store
+    if _history_store is None:
+        _history_store = HistoryStore(history_db_path)
+    return _history_store
+
+
+# =========================================
+# Trend view
+# =========================================
+
+def display_trend_view(selected_teacher, aspect_categories):
+    from helpers.graph_generator import build_trend_figure
+    with st.expander(f"Trends across semesters: {selected_teacher}"):
+        history = get_history_store()
+        with st.spinner("Updating the semester history..."):
+            history.sync()
+        selected_course = st.selectbox("Course", ["All"] + history.courses(selected_teacher), key="trend_course")
+        course = None if selected_course == "All" else selected_course
+        trend_df = history.aspect_trend(aspect_categories, selected_teacher, course)
+        if trend_df.empty or trend_df["semester"].nunique() < 2:
+            st.caption("Trends appear once this teacher has been processed in at least two semesters.")
+            return
+        polarity = st.radio("Polarity", ["Positive", "Negative", "Neutral"], horizontal=True, key="trend_polarity")
+        st.plotly_chart(build_trend_figure(trend_df, polarity), use_container_width=True)
+        responses = history.responses_by_semester(selected_teacher, course)
+        st.dataframe(responses.set_index("semester").T, use_container_width=True)
+
+
+def main():
+    # Legacy CSV results are converted into the result store first, so they reach the history too
+    semesters = sys.argv[1:] or sorted(
+        name for name in os.listdir("Datasets") if os.path.isdir(os.path.join("Datasets", name))
+    )
+    for semester in semesters:
+        import_legacy_semester(semester)
+    history = get_history_store()
+    for semester, changed in history.sync(semesters).items():
+        print(f"{semester}: {changed} teachers ingested")
+
+
+if __name__ == "__main__":
+    # Usage: python -m helpers.history_store [semester ...]   (all semesters under Datasets/ by default)
+    main()
@@ -0,0 +1,74 @@
+import io
+import importlib.util
+import pandas as pd
+import streamlit as st
+from pandas.api.types import union_categoricals
+from helpers.result_store import CATEGORICAL_COLUMNS
+from helpers.utils import cache_max_entries, cache_ttl_seconds
+
+# =========================================
+# Reading feedback uploads
+# =========================================
+# Only the columns the dashboard uses are parsed, as text, and the repeated ones (teacher, course, class,
+# target, semester) as categoricals. CSV files are read in chunks and every chunk is cut down
+# to teacher feedback right away, so the rows about courses never sit in memory together.
+
+REQUIRED_COLUMNS = ['FacultyName', 'Course', 'Comments', 'Target', 'Class']
+FEEDBACK_COLUMNS = REQUIRED_COLUMNS + ['Semester']
+csv_chunk_rows = 100_000
+
+# python-calamine reads XLSX many times faster than openpyxl; pandas uses it when it is installed
+xlsx_engine = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+
+def check_feedback_columns(columns):
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"The file has no {', '.join(missing)} column(s); expected {', '.join(REQUIRED_COLUMNS)}.")
+
+
+def teacher_rows(df):
+    return df[df['Target'].str.contains('Teacher', case=False, na=False)]
+
+
+def to_categoricals(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def concat_chunks(chunks):
+    # pd.concat turns categoricals with different categories back into text, so they are unioned per column
+    categorical = [col for col in CATEGORICAL_COLUMNS if col in chunks[0].columns]
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for col in categorical:
+        df[col] = union_categoricals([chunk[col] for chunk in chunks])
+    return df[chunks[0].columns]
+
+
+def read_feedback_csv(buffer, chunk_rows=None):
+    # The header is read first so the parser is given the exact columns and their dtypes
+    columns = [col for col in pd.read_csv(buffer, nrows=0).columns if col in FEEDBACK_COLUMNS]
+    check_feedback_columns(columns)
+    buffer.seek(0)
+    dtypes = {col: "category" if col in CATEGORICAL_COLUMNS else str for col in columns}
+    reader = pd.read_csv(buffer, usecols=columns, dtype=dtypes, chunksize=chunk_rows or csv_chunk_rows)
+    chunks = [teacher_rows(chunk) for chunk in reader]
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return concat_chunks(chunks)
+
+
+def read_feedback_xlsx(buffer):
+    df = pd.read_excel(buffer, usecols=lambda col: col in FEEDBACK_COLUMNS, dtype=str, engine=xlsx_engine)
+    check_feedback_columns(df.columns)
+    return to_categoricals(teacher_rows(df).reset_index(drop=True))
+
+
+# Uploads are parsed once per distinct file content instead of on every rerun
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner=False)
+def load_feedback_upload(file_bytes, file_name):
+    """Teacher feedback rows of an uploaded CSV or XLSX file; raises ValueError if a required column is missing."""
+    buffer = io.BytesIO(file_bytes)
+    return read_feedback_xlsx(buffer) if file_name.endswith('.xlsx') else read_feedback_csv(buffer)
@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+import pandas as pd
+from helpers.aspect_masks import skip_llm_mask, compute_aspect_mask
+
+# =========================================
+# CPU fast path in front of the LLM
+# =========================================
+# Many comments are nothing but a few well-known adjectives ("humble, cooperative, caring"). A comment is
+# resolved here only when every word in it is either a lexicon term or a filler word and each aspect it touches
+# gets a single polarity; anything else (negations, "but", unknown words, mixed feelings) goes to the LLM.
+
+LEXICON_ASPECTS = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
+
+LEXICON = {
+    "Behavior": {
+        "Positive": [
+            "humble", "cooperative", "co-operative", "coperative", "caring", "friendly", "kind", "polite", "helpful",
+            "supportive", "punctual", "honest", "patient", "respectful", "gentle", "soft spoken", "well mannered",
+            "well-mannered", "sincere", "approachable", "understanding", "encouraging",
+        ],
+        "Negative": ["rude", "arrogant", "harsh", "impolite", "unfriendly", "careless", "unpunctual"],
+    },
+    "Teaching Skills": {
+        "Positive": [
+            "interactive", "engaging", "well prepared", "well-prepared", "well organized", "well-organized", "organized",
+            "explains well", "clear explanations", "clear explanation", "teaches well",
+        ] + [f"{adjective} teaching{suffix}" for adjective in ["good", "great", "excellent", "best", "amazing", "outstanding"]
+             for suffix in ["", " method", " style", " skills"]],
+        "Negative": ["boring", "confusing", "poor teaching", "bad teaching"],
+    },
+    "Knowledge": {
+        "Positive": [
+            "knowledgeable", "expert", "mastermind", "competent", "good knowledge", "great knowledge", "vast knowledge",
+            "deep knowledge",
+        ],
+        "Negative": ["less knowledge", "poor knowledge"],
+    },
+    "Fair in Assessment": {
+        "Positive": ["fair", "unbiased", "fair in grading", "fair in assessment", "fair marking"],
+        "Negative": ["biased", "unfair"],
+    },
+    "Experience": {
+        "Positive": ["experienced", "highly experienced", "very experienced"],
+        "Negative": ["inexperienced"],
+    },
+}
+
+# Words that carry no aspect or sentiment of their own
+FILLER_WORDS = {
+    "very", "so", "really", "extremely", "highly", "quite", "always", "also", "and", "a", "an", "the", "she", "he",
+    "is", "was", "are", "were", "has", "have", "her", "his", "our", "my", "teacher", "teachers", "mam", "maam", "ma'am",
+    "madam", "sir", "miss", "mr", "mrs", "person", "lady", "instructor", "too", "in", "class", "overall", "thank", "you",
+}
+
+TERM_ASPECTS = {
+    term: (aspect, polarity)
+    for aspect, polarities in LEXICON.items()
+    for polarity, terms in polarities.items()
+    for term in terms
+}
+# Longest terms first, so "fair in grading" wins over "fair"
+TERM_PATTERN = re.compile(
+    r"(?<![\w'-])(" + "|".join(re.escape(term) for term in sorted(TERM_ASPECTS, key=len, reverse=True)) + r")(?![\w'-])",
+    re.IGNORECASE,
+)
+WORD_PATTERN = re.compile(r"[a-z]+(?:['-][a-z]+)*")
+
+# Longer comments almost always say something the lexicon cannot see
+max_words = 12
+
+# Marks the llm_response of rows answered here, so they are never mistaken for LLM output
+LEXICON_RESPONSE_PREFIX = "[lexicon] "
+
+
+def lexicon_response(result_dict):
+    return LEXICON_RESPONSE_PREFIX + json.dumps(result_dict)
+
+
+def classify_comment(comment):
+    """Return the ABSA result dict for a comment the lexicon fully explains, or None to leave it to the LLM."""
+    if not isinstance(comment, str):
+        return None
+    matches = list(TERM_PATTERN.finditer(comment))
+    if not matches:
+        return None
+    leftover = TERM_PATTERN.sub(" ", comment).lower()
+    words = WORD_PATTERN.findall(leftover)
+    if len(words) + len(matches) > max_words or any(word not in FILLER_WORDS for word in words):
+        return None
+
+    found = {}
+    for match in matches:
+        aspect, polarity = TERM_ASPECTS[match.group(1).lower()]
+        terms, polarities = found.setdefault(aspect, ([], set()))
+        # Terms are taken verbatim from the comment, as the LLM prompt asks
+        if match.group(1) not in terms:
+            terms.append(match.group(1))
+        polarities.add(polarity)
+    if any(len(polarities) > 1 for _, polarities in found.values()):
+        return None
+
+    result = {}
+    for aspect in LEXICON_ASPECTS:
+        if aspect in found:
+            terms, polarities = found[aspect]
+            result[aspect] = {"Aspect Terms": terms, "Polarity": next(iter(polarities))}
+        else:
+            result[aspect] = {"Aspect Terms": None, "Polarity": None}
+    return result
+
+
+# =========================================
+# Agreement with earlier LLM outputs
+# =========================================
+
+def measure_agreement(results_df, aspects=None):
+    """Compare the fast path with the stored LLM results on every comment it would resolve."""
+    aspects = [aspect for aspect in (aspects or LEXICON_ASPECTS) if f"{aspect}_terms" in results_df.columns]
+    candidates = results_df[~skip_llm_mask(results_df['Comments'])]
+    if "llm_response" in candidates.columns:
+        # Rows the fast path answered itself would only agree with themselves
+        candidates = candidates[~candidates["llm_response"].astype(str).str.startswith(LEXICON_RESPONSE_PREFIX)]
+    resolved = {idx: classify_comment(comment) for idx, comment in candidates['Comments'].items()}
+    resolved = {idx: result for idx, result in resolved.items() if result is not None}
+
+    report = {
+        "comments": len(candidates),
+        "resolved": len(resolved),
+        "coverage": len(resolved) / len(candidates) if len(candidates) else 0.0,
+        "aspects": {},
+    }
+    if not resolved:
+        return report
+    resolved_df = results_df.loc[list(resolved)]
+    all_mention = all_polarity = all_polarity_total = 0
+    for aspect in aspects:
+        llm_mentioned = compute_aspect_mask(resolved_df, aspect)
+        fast_mentioned = pd.Series({idx: result[aspect]["Aspect Terms"] is not None for idx, result in resolved.items()})
+        mention_agree = int((llm_mentioned == fast_mentioned).sum())
+
+        # Polarity is only comparable where both saw the aspect
+        both = llm_mentioned & fast_mentioned
+        llm_polarity = resolved_df.loc[both, f"{aspect}_polarity"].astype(str).str.strip().str.lower()
+        fast_polarity = pd.Series({idx: resolved[idx][aspect]["Polarity"].lower() for idx in both[both].index}, dtype=str)
+        polarity_agree = int((llm_polarity == fast_polarity).sum())
+
+        report["aspects"][aspect] = {
+            "mention_agreement": mention_agree / len(resolved),
+            "polarity_agreement": polarity_agree / int(both.sum()) if both.any() else None,
+            "both_mentioned": int(both.sum()),
+        }
+        all_mention += mention_agree
+        all_polarity += polarity_agree
+        all_polarity_total += int(both.sum())
+    report["mention_agreement"] = all_mention / (len(resolved) * len(aspects)) if aspects else None
+    report["polarity_agreement"] = all_polarity / all_polarity_total if all_polarity_total else None
+    return report
+
+
+def load_outputs(source):
+    # A processed CSV, or the name of a semester in the result store
+    if source.endswith(".csv"):
+        return pd.read_csv(source)
+    from helpers.result_store import load_semester_results
+    results_df = load_semester_results(source)
+    if results_df is None:
+        # Semesters processed before the result store existed
+        paths = sorted(glob.glob(os.path.join("Datasets", source, "*_processed_feedback.csv")))
+        results_df = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True) if paths else None
+    return results_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how well the lexicon fast path agrees with stored LLM results.")
+    parser.add_argument("sources", nargs="+", help="Semester names under Datasets/ or processed feedback CSV files")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    reports = {}
+    for source in args.sources:
+        results_df = load_outputs(source)
+        if results_df is None:
+            print(f"{source}: no processed results found", file=sys.stderr)
+            continue
+        report = measure_agreement(results_df)
+        reports[source] = report
+        print(f"{source}: {report['resolved']} of {report['comments']} comments resolved locally ({report['coverage']:.0%})")
+        if report["resolved"]:
+            polarity = report["polarity_agreement"]
+            print(f"  aspect mentions agree {report['mention_agreement']:.1%}, polarity agrees "
+                  + (f"{polarity:.1%}" if polarity is not None else "n/a"))
+            for aspect, stats in report["aspects"].items():
+                polarity = stats["polarity_agreement"]
+                print(f"  {aspect:<20} mentions {stats['mention_agreement']:.1%}  polarity "
+                      + (f"{polarity:.1%} of {stats['both_mentioned']}" if polarity is not None else "n/a"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    # Usage: python -m helpers.lexicon_classifier <semester or processed CSV> [...] [--output agreement.json]
+    main()
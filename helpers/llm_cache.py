@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# =========================================
+# Persistent cache of LLM ABSA results
+# =========================================
+# The app and the semester worker share the file, so it runs in WAL mode (readers never block the writer)
+# and waits for a lock instead of failing. Cache hits only record their access time in memory and write
+# them in batches, and the size limit is checked every trim_every_inserts inserts rather than on each one.
+
+busy_timeout_seconds = 30
+access_flush_every = 256
+trim_every_inserts = 1000
+
+def normalize_comment(text):
+    # Case and whitespace never change the ABSA result, so they are not part of the key
+    return " ".join(str(text).lower().split())
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResultCache:
+    """On-disk SQLite cache of LLM responses keyed by comment, system prompt and model."""
+
+    def __init__(self, db_path, max_entries=100000):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_access = {}
+        self._inserts_since_trim = 0
+        self._conn = sqlite3.connect(db_path, timeout=busy_timeout_seconds, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL a commit is only synced at checkpoints; a crash can lose the last results, never corrupt the file
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_results (
+                key TEXT PRIMARY KEY,
+                model_name TEXT,
+                prompt_hash TEXT,
+                comment TEXT,
+                llm_response TEXT,
+                result_json TEXT,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_results_last_access ON llm_results(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(comment, system_prompt, model_name):
+        return hash_text("\x1f".join([normalize_comment(comment), hash_text(system_prompt), model_name]))
+
+    def get(self, comment, system_prompt, model_name):
+        """Return (llm_response, result_dict) for a cached comment, or None."""
+        key = self.make_key(comment, system_prompt, model_name)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT llm_response, result_json FROM llm_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_access[key] = time.time()
+            if len(self._pending_access) >= access_flush_every:
+                self._write_access_times()
+                self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def put(self, comment, system_prompt, model_name, llm_response, result_dict):
+        key = self.make_key(comment, system_prompt, model_name)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model_name, hash_text(system_prompt), normalize_comment(comment),
+                 llm_response, json.dumps(result_dict), time.time())
+            )
+            self._pending_access.pop(key, None)
+            self._write_access_times()
+            self._inserts_since_trim += 1
+            if self._inserts_since_trim >= trim_every_inserts:
+                self._evict()
+            self._conn.commit()
+
+    def flush(self):
+        """Write the access times of recent cache hits."""
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+
+    def _write_access_times(self):
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE llm_results SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _evict(self):
+        self._inserts_since_trim = 0
+        # Drop the least recently used entries once the cache grows past its size limit
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_results").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_results WHERE key IN "
+                "(SELECT key FROM llm_results ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._pending_access.clear()
+            self._inserts_since_trim = 0
+            self._conn.execute("DELETE FROM llm_results")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,59 @@
+import os
+import json
+
+# =========================================
+# Append-only journal of per-row LLM results
+# =========================================
+
+def journal_path(semester_name, selected_teacher):
+    return f"Datasets/{semester_name}/{selected_teacher}_llm_journal.jsonl"
+
+
+def load_journal(path):
+    """Return the latest journal entry of every row, keyed by the row index as a string."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write can leave a truncated last line; everything before it is still valid
+                continue
+            entries[entry["idx"]] = entry
+    return entries
+
+
+def failed_rows(path):
+    return [idx for idx, entry in load_journal(path).items() if entry["status"] == "failed"]
+
+
+class FeedbackJournal:
+    """Appends one line per processed row so an interrupted run can pick up where it stopped."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, idx, comment, status, llm_response=None, result_dict=None, error=None):
+        entry = {
+            "idx": str(idx),
+            "comment": comment,
+            "status": status,
+            "llm_response": llm_response,
+            "result": result_dict,
+            "error": error,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,16 +1,127 @@
-import pandas as pd
-import re
 import os
+import json
+import time
+import threading
 import requests
 import streamlit as st
-from helpers.utils import parse_json_safe
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from helpers.utils import JsonObjectTracker
+from helpers.llm_cache import LLMResultCache
+from helpers.result_store import save_teacher_results
+from helpers.aspect_masks import skip_llm_mask
+from helpers.llm_journal import FeedbackJournal, journal_path, load_journal
+from helpers.telemetry import OLLAMA_METRIC_FIELDS
+from helpers.ollama_pool import OllamaPool, parse_keep_alive
+from helpers.lexicon_classifier import classify_comment, lexicon_response
+from helpers.absa_schema import build_absa_schema, build_batch_schema, absa_validation_error, parse_absa_response
+from helpers.near_duplicates import NearDuplicateIndex, propagate_result, NEAR_DUPLICATE_RESPONSE_PREFIX
 
 
-api_url = st.secrets["NGROK_URL"] 
+# Ollama hosts: OLLAMA_ENDPOINTS is a list of URLs or of {url, weight} tables; a single NGROK_URL still works on its own
+ollama_endpoints = list(st.secrets.get("OLLAMA_ENDPOINTS", [])) or [st.secrets["NGROK_URL"]]
+model_name = 'gemma2:2b'  # The model name to use
+# "least_outstanding" sends each request to the host with the fewest in flight; "weighted" picks by weight
+llm_routing = st.secrets.get("LLM_ROUTING", "least_outstanding")
+llm_connect_timeout = float(st.secrets.get("LLM_CONNECT_TIMEOUT", 5))
+# Longest wait for the next bytes of a reply, so one hung host cannot stall a whole run
+llm_read_timeout = float(st.secrets.get("LLM_READ_TIMEOUT", 120))
+# Further attempts on another host after a connection error, timeout, 429 or 5xx
+llm_max_retries = int(st.secrets.get("LLM_MAX_RETRIES", 2))
+# Number of comments sent to the Ollama hosts at the same time
+llm_concurrency = int(st.secrets.get("LLM_CONCURRENCY", 4 * len(ollama_endpoints)))
+# Stream replies, so a reply without a schema can be cut off soon after its JSON object is complete
+llm_stream = bool(st.secrets.get("LLM_STREAM", True))
+# After the JSON object closes, how long to keep reading for Ollama's final chunk (token counts and durations)
+# when no schema bounds the reply; the response is closed early if it has not arrived by then
+llm_stream_done_seconds = float(st.secrets.get("LLM_STREAM_DONE_SECONDS", 0.5))
+# Comments packed into one request; 1 sends every comment on its own
+llm_batch_size = int(st.secrets.get("LLM_BATCH_SIZE", 1))
+# How long the hosts keep the model loaded after a request, as Ollama's keep_alive ("30m", seconds, or -1 for ever)
+llm_keep_alive = st.secrets.get("LLM_KEEP_ALIVE", "30m")
+# Load the model on idle hosts as soon as the processor starts, before the first comment is sent
+llm_warm_up = bool(st.secrets.get("LLM_WARM_UP", True))
+# A request whose model load took longer than this counts as a cold start
+cold_start_load_seconds = 0.5
+# Times a comment whose reply does not match the JSON schema is asked again before it counts as failed
+llm_max_reasks = int(st.secrets.get("LLM_MAX_REASKS", 2))
+llm_cache_path = st.secrets.get("LLM_CACHE_PATH", "Datasets/llm_cache.sqlite")
+llm_cache_max_entries = int(st.secrets.get("LLM_CACHE_MAX_ENTRIES", 100000))
+# Comments made only of well-known terms are classified on the CPU instead of by the LLM
+llm_fast_path = bool(st.secrets.get("LLM_FAST_PATH", True))
+# Near-duplicate comments (typos, punctuation, spacing) share one LLM answer; the threshold is a shingle Jaccard similarity
+llm_near_duplicates = bool(st.secrets.get("LLM_NEAR_DUPLICATES", True))
+llm_near_duplicate_threshold = float(st.secrets.get("LLM_NEAR_DUPLICATE_THRESHOLD", 0.8))
+
+# Kept identical for every request (aspects go in the schema, batches in the user message), so the hosts
+# can reuse the already evaluated prompt prefix
+absa_system_prompt = """
+    You are an expert in Aspect-Based Sentiment Analysis (ABSA). Your task is to analyze teacher reviews and extract aspect-specific information for the following predefined categories:
+
+    - Teaching Skills  
+    - Knowledge  
+    - Fair in Assessment  
+    - Experience  
+    - Behavior  
+
+    Instructions:
+    1. For each aspect category **explicitly or implicitly mentioned** in the review:
+    - Extract the **exact aspect term(s) or phrase(s)** from the review text. Only include substrings that appear verbatim in the review.
+    - If multiple terms/phrases are found, return them as a list.
+    - If no relevant phrase is found for a category, return `"Aspect Terms": None` and `"Polarity": None`.
+
+    2. Determine the **sentiment polarity** toward each mentioned aspect: one of `{Positive, Negative, Neutral}`.
+
+    3. Return the output in the following structured JSON format **without any explanation or commentary**:
+
+    ```json
+    {
+    "Teaching Skills": {
+        "Aspect Terms": [...], 
+        "Polarity": "..."
+    },
+    "Knowledge": {
+        "Aspect Terms": [...], 
+        "Polarity": "..."
+    },
+    ...
+    }
+
+    """
+
+_llm_cache = None
+_ollama_pool = None
+
+# Shared by every Streamlit session of this server process
+def get_llm_cache():
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResultCache(llm_cache_path, max_entries=llm_cache_max_entries)
+    return _llm_cache
+
+# Host health is shared by every dispatcher of this process
+def get_ollama_pool():
+    global _ollama_pool
+    if _ollama_pool is None:
+        _ollama_pool = OllamaPool(
+            ollama_endpoints, routing=llm_routing, connect_timeout=llm_connect_timeout,
+            read_timeout=llm_read_timeout, max_retries=llm_max_retries,
+        )
+    return _ollama_pool
 
 # Function to ask the LLM for feedback analysis
 
-def ask_ollama_api(input_content, system_prompt, model_name, ngrok_url):
+def ask_ollama_api(input_content, system_prompt, model_name, ngrok_url, session=None, stream=llm_stream, timeout=None,
+                   response_format=None, keep_alive=llm_keep_alive):
+    reply, _ = ask_ollama_api_with_metrics(input_content, system_prompt, model_name, ngrok_url, session, stream, timeout,
+                                           response_format, keep_alive)
+    return reply
+
+
+# Same request, also returning the timing and token counts of the reply
+def ask_ollama_api_with_metrics(input_content, system_prompt, model_name, ngrok_url, session=None, stream=llm_stream, timeout=None,
+                                response_format=None, keep_alive=llm_keep_alive):
     url = f"{ngrok_url}/api/chat"
     headers = {
         'Content-Type': 'application/json',
@@ -21,23 +132,87 @@ def ask_ollama_api(input_content, system_prompt, model_name, ngrok_url):
             {'role': 'system', 'content': system_prompt},
             {'role': 'user', 'content': input_content}
         ],
-        'stream': False  # make sure to set stream=False if you want single JSON
+        'stream': stream,  # make sure to set stream=False if you want single JSON
+        'keep_alive': keep_alive,
     }
+    if response_format is not None:
+        # A JSON schema here makes Ollama constrain the reply to it
+        payload['format'] = response_format
 
-    response = requests.post(url, json=payload, headers=headers)
+    start = time.perf_counter()
+    # Reuse the pooled keep-alive connections of the dispatcher when given one
+    http = session if session is not None else requests
+    response = http.post(url, json=payload, headers=headers, stream=stream,
+                         timeout=timeout or (llm_connect_timeout, llm_read_timeout))
+    metrics = {"status_code": response.status_code, "streamed": stream}
 
     if response.status_code == 200:
         try:
-            data = response.json()
-            # If you want only the assistant's reply:
-            reply = data.get("message", {}).get("content", "").strip()
-            return reply
+            if stream:
+                # With a schema the generation ends with the object, so the final chunk follows right away
+                reply = read_streamed_reply(response, metrics, read_to_done=response_format is not None)
+            else:
+                data = response.json()
+                metrics.update({field: data[field] for field in OLLAMA_METRIC_FIELDS if field in data})
+                # If you want only the assistant's reply:
+                reply = data.get("message", {}).get("content", "").strip()
+        except requests.RequestException:
+            # A stream that stalls or drops is a failed request, to be retried on another host
+            raise
         except Exception as e:
-            return f"Error parsing JSON: {e}\nRaw text: {response.text}"
+            reply = f"Error parsing JSON: {e}\nRaw text: {response.text}"
     else:
-        return f"Error: {response.status_code} - {response.text}"
+        reply = f"Error: {response.status_code} - {response.text}"
+
+    metrics["wall_seconds"] = time.perf_counter() - start
+    if "first_token_time" in metrics:
+        metrics["first_token_seconds"] = metrics.pop("first_token_time") - start
+    return reply, metrics
 
 
+def read_streamed_reply(response, metrics=None, read_to_done=False, done_seconds=None):
+    # Collect /api/chat NDJSON chunks; the reply ends where the first top-level JSON object closes. Reading goes on
+    # to Ollama's final "done" chunk, which carries the token counts and durations, and leaves the pooled connection
+    # reusable. Unless read_to_done, trailing output is only read for done_seconds before hanging up
+    metrics = metrics if metrics is not None else {}
+    done_seconds = llm_stream_done_seconds if done_seconds is None else done_seconds
+    reply = ""
+    closed_reply = None
+    deadline = None
+    chunks = 0
+    tracker = JsonObjectTracker()
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                chunks += 1
+                metrics.setdefault("first_token_time", time.perf_counter())
+            if closed_reply is None:
+                end = tracker.feed(content)
+                reply += content
+                if end != -1:
+                    closed_reply = reply[:end].strip()
+                    if not read_to_done:
+                        deadline = time.perf_counter() + done_seconds
+            if chunk.get("done"):
+                # Nothing follows; the loop ends with the body, which hands the connection back to the pool
+                metrics.update({field: chunk[field] for field in OLLAMA_METRIC_FIELDS if field in chunk})
+                deadline = None
+            elif deadline is not None and time.perf_counter() > deadline:
+                # Closing the unfinished response drops the connection, which stops the generation on the host.
+                # Ollama's metrics never arrive then; only the streamed chunks are known
+                metrics["stopped_early"] = True
+                metrics["streamed_chunks"] = chunks
+                response.close()
+                break
+    except BaseException:
+        response.close()
+        raise
+    return closed_reply if closed_reply is not None else reply.strip()
+
 
 # def ask_ollama(input_content, system_prompt, model_name):
 #     response = ollama.chat(model=model_name, messages=[
@@ -48,122 +223,469 @@ def ask_ollama_api(input_content, system_prompt, model_name, ngrok_url):
 #     return response_text
 
 
-# Function to process teacher feedback dataframe with LLM
-def process_teacher_feedback_with_llm(teacher_df, selected_teacher, semester_name, aspects):
-    system_prompt = """
-    You are an expert in Aspect-Based Sentiment Analysis (ABSA). Your task is to analyze teacher reviews and extract aspect-specific information for the following predefined categories:
+# =========================================
+# Model Warm-up
+# =========================================
 
-    - Teaching Stills  
-    - Knowledge  
-    - Fair in Assessment  
-    - Experience  
-    - Behavior  
+def warm_up_model(ngrok_url, model_name, system_prompt=absa_system_prompt, session=None, timeout=None, keep_alive=llm_keep_alive):
+    """Load the model on one host and evaluate the system prompt; return the request metrics."""
+    payload = {
+        'model': model_name,
+        'messages': [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': "{}"}
+        ],
+        'stream': False,
+        'keep_alive': keep_alive,
+        # One token is enough; the options that decide how the model is loaded stay as in real requests
+        'options': {'num_predict': 1},
+    }
+    start = time.perf_counter()
+    metrics = {"warm_up": True, "endpoint": ngrok_url, "streamed": False}
+    http = session if session is not None else requests
+    try:
+        response = http.post(f"{ngrok_url}/api/chat", json=payload, timeout=timeout or (llm_connect_timeout, llm_read_timeout))
+        metrics["status_code"] = response.status_code
+        if response.status_code == 200:
+            data = response.json()
+            metrics.update({field: data[field] for field in OLLAMA_METRIC_FIELDS if field in data})
+    except (requests.RequestException, ValueError) as e:
+        print(f"Warm-up of {ngrok_url} failed: {e}")
+        metrics.update({"status_code": None, "error": str(e)})
+    metrics["wall_seconds"] = time.perf_counter() - start
+    metrics["cold_start"] = is_cold_start(metrics)
+    return metrics
 
-    Instructions:
-    1. For each aspect category **explicitly or implicitly mentioned** in the review:
-    - Extract the **exact aspect term(s) or phrase(s)** from the review text. Only include substrings that appear verbatim in the review.
-    - If multiple terms/phrases are found, return them as a list.
-    - If no relevant phrase is found for a category, return `"Aspect Terms": None` and `"Polarity": None`.
 
-    2. Determine the **sentiment polarity** toward each mentioned aspect: one of `{Positive, Negative, Neutral}`.
+def warm_up_endpoints(pool, model_name, session=None, telemetry=None):
+    # Hosts used within the keep-alive still have the model loaded; the others are warmed in the background
+    threads = []
+    for endpoint in pool.claim_idle_endpoints(parse_keep_alive(llm_keep_alive)):
+        def warm_up(endpoint=endpoint):
+            metrics = warm_up_model(endpoint.url, model_name, session=session, timeout=pool.timeout)
+            if metrics["status_code"] == 200:
+                # Requests sent from now on find the model loaded
+                pool.mark_used(endpoint)
+            if telemetry is not None:
+                telemetry.record_llm_request(metrics)
+        thread = threading.Thread(target=warm_up, name="ollama-warm-up", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
 
-    3. Return the output in the following structured JSON format **without any explanation or commentary**:
 
-    ```json
-    {
-    "Teaching Skills": {
-        "Aspect Terms": [...], 
-        "Polarity": "..."
-    },
-    "Knowledge": {
-        "Aspect Terms": [...], 
-        "Polarity": "..."
-    },
-    ...
-    }
+def is_cold_start(metrics):
+    # Every reply read to its done chunk carries Ollama's model load time. Only a schema-less stream cut off
+    # before it lacks one; that request is judged by how long the host sat idle and marked as estimated
+    if metrics.get("load_duration") is not None:
+        return metrics["load_duration"] / 1e9 > cold_start_load_seconds
+    if "idle_seconds" in metrics:
+        metrics["cold_start_estimated"] = True
+        return metrics["idle_seconds"] is None or metrics["idle_seconds"] > parse_keep_alive(llm_keep_alive)
+    return None
 
-    """
+
+# =========================================
+# Concurrent LLM Dispatch
+# =========================================
+
+def create_llm_session(pool_size, hosts=1):
+    session = requests.Session()
+    # One keep-alive connection per worker thread and host so requests never wait on the pool
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class LLMDispatcher:
+    """Sends comments to the Ollama hosts from a bounded pool of worker threads."""
+
+    def __init__(self, model_name, pool=None, max_workers=llm_concurrency, telemetry=None, warm_up=llm_warm_up):
+        self.model_name = model_name
+        self.pool = pool if pool is not None else get_ollama_pool()
+        self.max_workers = max(1, int(max_workers))
+        # Every request's metrics are recorded here when given
+        self.telemetry = telemetry
+        self.session = create_llm_session(self.max_workers, len(self.pool.endpoints))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+        # Hosts that sat idle past the keep-alive (e.g. between two teachers) start loading the model right away
+        self.warm_up_threads = warm_up_endpoints(self.pool, model_name, self.session, telemetry) if warm_up else []
+
+    def submit(self, input_content, system_prompt, response_format=None):
+        return self.executor.submit(self._ask, input_content, system_prompt, response_format)
+
+    def _ask(self, input_content, system_prompt, response_format=None):
+        start = time.perf_counter()
+        try:
+            reply, metrics = self.pool.call(lambda url, timeout: ask_ollama_api_with_metrics(
+                input_content, system_prompt, model_name=self.model_name, ngrok_url=url, session=self.session, timeout=timeout,
+                response_format=response_format
+            ))
+        except Exception as e:
+            if self.telemetry is not None:
+                self.telemetry.record_llm_request({"status_code": None, "error": str(e), "wall_seconds": time.perf_counter() - start})
+            raise
+        metrics["cold_start"] = is_cold_start(metrics)
+        if self.telemetry is not None:
+            self.telemetry.record_llm_request(metrics)
+        return reply
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for thread in self.warm_up_threads:
+            thread.join()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =========================================
+# Batched Prompts
+# =========================================
+
+def build_batch_prompt(comments):
+    # The system prompt stays the same; only the user message changes for a batch
+    reviews = [{"id": str(num), "review": comment} for num, comment in enumerate(comments, start=1)]
+    return (
+        "Analyze each of the following reviews separately. Return a single JSON object whose keys are "
+        "the review ids and whose values are the JSON output for that review in the format described above.\n\n"
+        + json.dumps(reviews, ensure_ascii=False)
+    )
+
+
+def split_batch_response(result_dict, count):
+    # Map each review position in the batch to its own result; missing or malformed ids are left out
+    if not isinstance(result_dict, dict):
+        return {}
+    per_comment = {}
+    for num in range(count):
+        comment_result = result_dict.get(str(num + 1))
+        if isinstance(comment_result, dict):
+            per_comment[num] = comment_result
+    return per_comment
+
+
+# Function to copy the parsed LLM output of one comment into the aspect columns
+def store_aspect_results(teacher_df, idx, result_dict, aspects):
+    if not result_dict:
+        return
+    for aspect in aspects:
+        if aspect in result_dict:
+            # Extract aspect terms and polarity
+            aspect_data = result_dict[aspect]
+
+            # Initialize defaults
+            aspect_terms = "None"
+            polarity = "Neutral"
+
+            if isinstance(aspect_data, dict):
+                # Case: aspect is a dict containing Aspect Terms and Polarity
+                aspect_terms = aspect_data.get("Aspect Terms", "None")
+                polarity = aspect_data.get("Polarity", "Neutral")
+            elif isinstance(aspect_data, list):
+                # Case: aspect is a list of aspect terms, polarity might be separately given
+                aspect_terms = aspect_data
+                polarity = result_dict.get("Polarity", "Neutral")
+            elif isinstance(aspect_data, str):
+                # Very rare case: if it's just a plain string
+                aspect_terms = aspect_data
+                polarity = result_dict.get("Polarity", "Neutral")
+            # Convert aspect_terms to comma-separated string if it's a list
+            if isinstance(aspect_terms, list):
+                aspect_terms = ",".join(aspect_terms) if aspect_terms else "None"
+            else:
+                aspect_terms = str(aspect_terms)
+
+
+            # Save to dataframe
+            teacher_df.at[idx, f"{aspect}_terms"] = aspect_terms
+            teacher_df.at[idx, f"{aspect}_polarity"] = polarity 
+            # print(f"Aspect: {aspect}, Terms: {aspect_terms}, Polarity: {polarity}")                        
+
+
+# Function to process teacher feedback dataframe with LLM, without any Streamlit calls so it can run in a worker
+def analyze_teacher_feedback(teacher_df, selected_teacher, semester_name, aspects, dispatcher=None, max_workers=None,
+                             batch_size=None, retry_failed=False, progress_callback=None, telemetry=None, fast_path=None,
+                             near_duplicates=None):
     # aspects = ["Teaching Pedagogy", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
     term_columns = [f"{aspect}_terms" for aspect in aspects]
     polarity_columns = [f"{aspect}_polarity" for aspect in aspects]
 
     # teacher_df = df[df['FacultyName'] == selected_teacher].copy()
 
-    # Add empty columns if they don't exist
-    for col in term_columns + polarity_columns:
+    # Add empty columns if they don't exist; llm_response too, so every stored part has the same columns
+    for col in term_columns + polarity_columns + ["llm_response"]:
         if col not in teacher_df.columns:
             teacher_df[col] = ""
 
-    indices_to_process = teacher_df.index
+    # Skip empty and placeholder comments before anything is sent to the LLM
+    indices_to_process = teacher_df.index[~skip_llm_mask(teacher_df['Comments'])].tolist()
 
-    model_name = 'gemma2:2b'  # The model name to use
-    
-    progress_bar = st.progress(0)
-    total = len(indices_to_process)
+    if dispatcher is None:
+        dispatcher_context = LLMDispatcher(model_name, max_workers=max_workers or llm_concurrency, telemetry=telemetry)
+    else:
+        # A shared dispatcher stays open for the next teacher
+        dispatcher_context = nullcontext(dispatcher)
+    llm_model = dispatcher.model_name if dispatcher is not None else model_name
+    system_prompt = absa_system_prompt
+    response_schema = build_absa_schema(aspects)
+    # Answers are only reused for the same prompt and the same schema
+    cache_prompt = system_prompt + json.dumps(response_schema, sort_keys=True)
+    llm_cache = get_llm_cache()
 
-    for idx_num, idx in enumerate(indices_to_process):
+    responses = {}
+    # Comments the lexicon fully explains never reach the LLM
+    fast_path_hits = 0
+    if llm_fast_path if fast_path is None else fast_path:
+        for idx in indices_to_process:
+            result_dict = classify_comment(teacher_df.at[idx, 'Comments'])
+            if result_dict is not None:
+                responses[idx] = (lexicon_response(result_dict), result_dict)
+                fast_path_hits += 1
+
+    # Rows finished by an earlier, interrupted run are taken from the journal; failed rows only on retry
+    journal_file = journal_path(semester_name, selected_teacher)
+    journal_entries = load_journal(journal_file)
+    resumed = 0
+    failed = []
+    for idx in indices_to_process:
+        if idx in responses:
+            continue
+        entry = journal_entries.get(str(idx))
+        if entry is None or entry["comment"] != teacher_df.at[idx, 'Comments']:
+            continue
+        if entry["status"] == "ok":
+            responses[idx] = (entry["llm_response"], entry["result"])
+            resumed += 1
+        elif not retry_failed:
+            failed.append(idx)
+
+    # Answer repeated comments from the cache and send each remaining distinct comment only once
+    pending = {}
+    cache_hits = 0
+    for idx in indices_to_process:
+        if idx in responses or idx in failed:
+            continue
         feedback = teacher_df.at[idx, 'Comments']
-        if (
-            pd.isna(feedback) or 
-            feedback.strip() == "" or 
-            re.fullmatch(r"[.\s]*", feedback) or 
-            len(feedback.strip()) < 8 or 
-            feedback.strip().lower().replace(".", "").replace(" ", "") in {"na", "n/a", "nocomments", "nocomment", "noany", "none"}
-        ):
+        cached = llm_cache.get(feedback, cache_prompt, llm_model)
+        if cached is not None:
+            responses[idx] = cached
+            cache_hits += 1
+        else:
+            pending.setdefault(llm_cache.make_key(feedback, cache_prompt, llm_model), []).append(idx)
+
+    # Of each cluster of near-duplicate comments only the first is sent. A semester job passes one index for all
+    # teachers, so a comment can also reuse the answer another teacher's comment already got
+    if near_duplicates is None and llm_near_duplicates:
+        near_duplicates = NearDuplicateIndex(llm_near_duplicate_threshold)
+    groups = []
+    group_entries = {}  # first index of a sent group -> its entry in the near-duplicate index
+    followers = {}  # entry -> groups waiting for that entry's answer
+    answered = []  # groups whose near duplicate was answered before this run
+    unmatched = []  # groups whose near duplicate's answer does not carry over and that are sent themselves
+    for idx_group in pending.values():
+        if near_duplicates is None:
+            groups.append(idx_group)
             continue
-        
-        try:
-            # Replace with your actual API URL
-            result_json = ask_ollama_api(feedback, system_prompt, model_name = model_name, ngrok_url=api_url)
-            teacher_df.at[idx, "llm_response"] = result_json
+        feedback = teacher_df.at[idx_group[0], 'Comments']
+        entry = near_duplicates.find(feedback)
+        if entry is None:
+            group_entries[idx_group[0]] = near_duplicates.add(feedback)
+            groups.append(idx_group)
+        elif near_duplicates.values[entry] is not None:
+            answered.append((idx_group, near_duplicates.values[entry]))
+        else:
+            followers.setdefault(entry, []).append(idx_group)
+
+    total = len(groups)
+    batch_size = max(1, int(batch_size or llm_batch_size))
+    done_count = 0
+    near_duplicate_hits = 0
+    # Re-asks so far per group, keyed by its first index
+    reasks = {}
+    repaired = 0
+
+    def send(batch):
+        if len(batch) == 1:
+            return dispatcher.submit(teacher_df.at[batch[0][0], 'Comments'], system_prompt, response_schema)
+        prompt = build_batch_prompt([teacher_df.at[idx_group[0], 'Comments'] for idx_group in batch])
+        return dispatcher.submit(prompt, system_prompt, build_batch_schema(aspects, len(batch)))
+
+    def record(idx_group, result_json, result_dict):
+        nonlocal repaired
+        if idx_group[0] in reasks:
+            repaired += len(idx_group)
+        llm_cache.put(teacher_df.at[idx_group[0], 'Comments'], cache_prompt, llm_model, result_json, result_dict)
+        for idx in idx_group:
+            responses[idx] = (result_json, result_dict)
+            journal.record(idx, teacher_df.at[idx, 'Comments'], "ok", result_json, result_dict)
+        entry = group_entries.get(idx_group[0])
+        if entry is not None:
+            near_duplicates.values[entry] = result_dict
+            for follower in followers.pop(entry, []):
+                record_near_duplicate(follower, result_dict)
+
+    def record_near_duplicate(idx_group, representative_result):
+        nonlocal near_duplicate_hits
+        # Aspect terms are matched again in this comment's own text; propagated answers stay out of the cache
+        result_dict = propagate_result(representative_result, teacher_df.at[idx_group[0], 'Comments'])
+        if result_dict is None:
+            unmatched.append(idx_group)
+            return
+        result_json = NEAR_DUPLICATE_RESPONSE_PREFIX + json.dumps(result_dict)
+        for idx in idx_group:
+            responses[idx] = (result_json, result_dict)
+            journal.record(idx, teacher_df.at[idx, 'Comments'], "ok", result_json, result_dict)
+        near_duplicate_hits += len(idx_group)
+
+    def send_unmatched(in_flight):
+        nonlocal total
+        while unmatched:
+            idx_group = unmatched.pop()
+            groups.append(idx_group)
+            total += 1
+            in_flight[send([idx_group])] = [idx_group]
+
+    def record_failure(idx_group, error, result_json=None):
+        for idx in idx_group:
+            failed.append(idx)
+            journal.record(idx, teacher_df.at[idx, 'Comments'], "failed", result_json, error=str(error))
+        entry = group_entries.pop(idx_group[0], None)
+        if entry is not None:
+            # Comments that waited for this one fail with it and are sent on their own when retried
+            near_duplicates.remove(entry)
+            for follower in followers.pop(entry, []):
+                record_failure(follower, error, result_json)
+
+    try:
+        with FeedbackJournal(journal_file) as journal, dispatcher_context as dispatcher:
+            for idx_group, representative_result in answered:
+                record_near_duplicate(idx_group, representative_result)
+
+            # Each in-flight request maps to the comment groups it answers
+            in_flight = {}
+            for start in range(0, total, batch_size):
+                batch = groups[start:start + batch_size]
+                in_flight[send(batch)] = batch
+            send_unmatched(in_flight)
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    try:
+                        result_json = future.result()
+                    except Exception as e:
+                        print(f"Error at index {batch[0][0]}: {e}")
+                        print()
+                        result_json = None
+                        error = e
 
-            result_dict = parse_json_safe(result_json)
-
-            if result_dict:
-                for aspect in aspects:
-                    if aspect in result_dict:
-                        # Extract aspect terms and polarity
-                        aspect_data = result_dict[aspect]
-
-                        # Initialize defaults
-                        aspect_terms = "None"
-                        polarity = "Neutral"
-
-                        if isinstance(aspect_data, dict):
-                            # Case: aspect is a dict containing Aspect Terms and Polarity
-                            aspect_terms = aspect_data.get("Aspect Terms", "None")
-                            polarity = aspect_data.get("Polarity", "Neutral")
-                        elif isinstance(aspect_data, list):
-                            # Case: aspect is a list of aspect terms, polarity might be separately given
-                            aspect_terms = aspect_data
-                            polarity = result_dict.get("Polarity", "Neutral")
-                        elif isinstance(aspect_data, str):
-                            # Very rare case: if it's just a plain string
-                            aspect_terms = aspect_data
-                            polarity = result_dict.get("Polarity", "Neutral")
-                        # Convert aspect_terms to comma-separated string if it's a list
-                        if isinstance(aspect_terms, list):
-                            aspect_terms = ",".join(aspect_terms) if aspect_terms else "None"
+                    if len(batch) == 1:
+                        idx_group = batch[0]
+                        if result_json is None:
+                            # Connection errors were already retried by the pool
+                            record_failure(idx_group, error)
+                            done_count += 1
+                            continue
+                        result_dict, error = parse_absa_response(result_json, aspects)
+                        if result_dict is not None:
+                            record(idx_group, result_json, result_dict)
+                            done_count += 1
+                        elif reasks.get(idx_group[0], 0) < llm_max_reasks:
+                            # Only the rows whose reply failed validation are asked again
+                            reasks[idx_group[0]] = reasks.get(idx_group[0], 0) + 1
+                            in_flight[send(batch)] = batch
                         else:
-                            aspect_terms = str(aspect_terms)
+                            print(f"Invalid reply at index {idx_group[0]}: {error}")
+                            record_failure(idx_group, f"Reply does not match the schema: {error}", result_json)
+                            done_count += 1
+                        continue
 
+                    # Split the batch reply per comment and fall back to single requests for what is not valid
+                    try:
+                        batch_dict = json.loads(result_json) if result_json is not None else None
+                    except ValueError:
+                        batch_dict = None
+                    per_comment = split_batch_response(batch_dict, len(batch))
+                    for num, idx_group in enumerate(batch):
+                        if num in per_comment and absa_validation_error(per_comment[num], aspects) is None:
+                            record(idx_group, json.dumps(per_comment[num]), per_comment[num])
+                            done_count += 1
+                        else:
+                            in_flight[send([idx_group])] = [idx_group]
+                send_unmatched(in_flight)
+
+                if progress_callback is not None:
+                    progress_callback(done_count, total)
+    finally:
+        # Entries still without an answer (the run was interrupted) must not hold back later comments
+        for entry in group_entries.values():
+            if entry in near_duplicates.values and near_duplicates.values[entry] is None:
+                near_duplicates.remove(entry)
 
-                        # Save to dataframe
-                        teacher_df.at[idx, f"{aspect}_terms"] = aspect_terms
-                        teacher_df.at[idx, f"{aspect}_polarity"] = polarity 
-                        # print(f"Aspect: {aspect}, Terms: {aspect_terms}, Polarity: {polarity}")                        
+    # Write results back in index order, whatever order the requests finished in
+    for idx in indices_to_process:
+        if idx not in responses:
+            continue
+        try:
+            result_json, result_dict = responses[idx]
+            teacher_df.at[idx, "llm_response"] = result_json
+            store_aspect_results(teacher_df, idx, result_dict, aspects)
         except Exception as e:
             print(f"Error at index {idx}: {e}")
             # print(f"Response: {result_json}")
             print()
-            continue
-        
-        # Update progress
-        progress_bar.progress((idx_num + 1) / total)
+
+    save_teacher_results(semester_name, selected_teacher, teacher_df)
+    llm_cache.flush()
+
+    # The journal is only needed while some rows still wait for a retry
+    if not failed:
+        os.remove(journal_file)
+
+    run_stats = {
+        "comments": len(indices_to_process),
+        "fast_path": fast_path_hits,
+        "cache_hits": cache_hits,
+        "near_duplicates": near_duplicate_hits,
+        "sent": len(groups),
+        "resumed": resumed,
+        "reasks": sum(reasks.values()),
+        "repaired": repaired,
+        "failed": len(failed),
+    }
+    return teacher_df, run_stats
+
+
+# Function to process teacher feedback dataframe with LLM
+def process_teacher_feedback_with_llm(teacher_df, selected_teacher, semester_name, aspects, max_workers=None, batch_size=None, retry_failed=False,
+                                     telemetry=None):
+    progress_bar = st.progress(0)
+
+    def update_progress(done_count, total):
+        progress_bar.progress(done_count / total)
+
+    teacher_df, run_stats = analyze_teacher_feedback(
+        teacher_df, selected_teacher, semester_name, aspects, max_workers=max_workers,
+        batch_size=batch_size, retry_failed=retry_failed, progress_callback=update_progress, telemetry=telemetry
+    )
 
     progress_bar.empty()  # Remove progress bar after completion
 
-    os.makedirs("Datasets/"+semester_name, exist_ok=True)
-    processed_path = f"Datasets/{semester_name}/{selected_teacher}_processed_feedback.csv"
-    teacher_df.to_csv(processed_path, index=False)
+    cache_stats = get_llm_cache().stats()
+    st.caption(
+        f"LLM cache: {run_stats['cache_hits']} of {run_stats['comments']} comments answered from cache, "
+        f"{run_stats['sent']} distinct comments sent to the model "
+        f"(lifetime hit rate {cache_stats['hit_rate']:.0%}, {cache_stats['entries']} cached results)."
+        + (f" {run_stats['fast_path']} comments resolved locally by the lexicon." if run_stats['fast_path'] else "")
+        + (f" {run_stats['near_duplicates']} near-duplicate comments reused another comment's answer." if run_stats['near_duplicates'] else "")
+        + (f" Resumed {run_stats['resumed']} comments from an interrupted run." if run_stats['resumed'] else "")
+        + (f" {run_stats['repaired']} comments answered validly after being asked again." if run_stats['repaired'] else "")
+    )
     return teacher_df
@@ -0,0 +1,251 @@
+import re
+import sys
+import zlib
+import difflib
+from functools import lru_cache
+from collections import Counter
+import numpy as np
+from helpers.lexicon_classifier import TERM_ASPECTS
+
+# =========================================
+# Near-duplicate comments answered by one LLM request
+# =========================================
+# Comments that differ only in punctuation, casing, spacing or a typo ("humble ,interctive , cooperative" and
+# "humble, interactive, cooperative") are found with MinHash over character shingles and LSH buckets, then
+# confirmed with the exact shingle Jaccard similarity. Misspelled sentiment words are corrected before shingling,
+# and two comments only match when they use the same sentiment words in the same order, so "knowledge is good,
+# behavior is bad" never borrows the answer of "knowledge is bad, behavior is good", and "interesting" never
+# matches "uninteresting". Only the first comment of a cluster goes to the LLM; the others receive its result when
+# every one of its aspect terms is found again, as whole words, in their own text, and are sent themselves otherwise.
+
+NEGATION_WORDS = {"not", "no", "never", "nor", "but", "although", "though", "however", "without", "except"}
+# Words that carry a polarity: the single-word lexicon terms plus common ones the lexicon leaves to the LLM
+# ("coperative" is left out: the lexicon lists that misspelling, here it is corrected to "cooperative")
+SENTIMENT_WORDS = {term for term in TERM_ASPECTS if re.fullmatch(r"[a-z]+", term)} - {"coperative"} | {
+    "good", "bad", "poor", "excellent", "great", "best", "worst", "better", "worse", "nice", "amazing", "awesome",
+    "outstanding", "perfect", "terrible", "horrible", "awful", "weak", "strong", "average", "satisfied",
+    "unsatisfied", "clear", "unclear", "strict", "lenient", "easy", "difficult", "hard", "slow", "fast", "late",
+    "lazy", "dedicated", "motivated", "irresponsible", "responsible", "unprofessional", "professional",
+}
+# "interesting" and "uninteresting" share nearly every shingle but mean the opposite
+NEGATING_PREFIXES = ("un", "in", "im", "ir", "dis", "non")
+# Typos are only corrected on words this long, so short words such as "bed" never turn into "bad"
+SENTIMENT_TYPO_MIN_LENGTH = 6
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+# 16 bands of 4 rows; a pair at 0.8 similarity shares about 6 bands, a pair at 0.5 about 1
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Candidates sharing fewer bands are almost never above the threshold and skip the exact Jaccard check
+MIN_BAND_HITS = 2
+
+# Marks the llm_response of rows that reuse another comment's answer
+NEAR_DUPLICATE_RESPONSE_PREFIX = "[near duplicate] "
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20240601)
+_perm_a = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_perm_b = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+
+NON_WORD_PATTERN = re.compile(r"[^\w']+")
+
+
+@lru_cache(maxsize=65536)
+def canonical_word(word):
+    # "interctive" -> "interactive"; any other word is kept as it is
+    if word in SENTIMENT_WORDS or len(word) < SENTIMENT_TYPO_MIN_LENGTH:
+        return word
+    for close in difflib.get_close_matches(word, SENTIMENT_WORDS, n=1, cutoff=0.8):
+        shorter, longer = sorted((word, close), key=len)
+        if len(longer) - len(shorter) > 1:
+            continue
+        # Another form of the word ("experience" for "experienced") is not a typo; a doubled last letter is
+        if longer.startswith(shorter) and longer[-1] != longer[-2]:
+            continue
+        return close
+    return word
+
+
+def normalize_for_shingles(comment):
+    return " ".join(canonical_word(word) for word in NON_WORD_PATTERN.sub(" ", str(comment).lower()).split())
+
+
+def shingles(comment):
+    text = normalize_for_shingles(comment)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[pos:pos + SHINGLE_SIZE] for pos in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def negation_signature(comment):
+    # "good teacher" and "not a good teacher" share most shingles but never the same answer
+    words = normalize_for_shingles(comment).split()
+    return frozenset(word for word in words if word in NEGATION_WORDS or word.endswith("n't"))
+
+
+def sentiment_signature(comment):
+    # Sentiment words in the order they appear, so swapping "good" and "bad" between aspects changes it
+    return tuple(word for word in normalize_for_shingles(comment).split() if word in SENTIMENT_WORDS)
+
+
+def negated_by_prefix(words, other_words):
+    # True when a word of one comment is a word of the other with a negating prefix ("prepared", "unprepared")
+    for first, second in ((words, other_words), (other_words, words)):
+        for word in first - second:
+            if any(word.startswith(prefix) and word[len(prefix):] in second for prefix in NEGATING_PREFIXES):
+                return True
+    return False
+
+
+def minhash_signature(shingle_set):
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    return ((np.outer(hashes, _perm_a) + _perm_b) % _MERSENNE_PRIME).min(axis=0)
+
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+
+class NearDuplicateIndex:
+    """LSH index of comments; each entry carries a value (e.g. the answer once it is known)."""
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+        self.values = {}
+        self._entries = {}
+        self._buckets = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def find(self, comment):
+        """Return the id of the most similar indexed comment at or above the threshold, or None."""
+        shingle_set = shingles(comment)
+        guards = (negation_signature(comment), sentiment_signature(comment))
+        words = set(normalize_for_shingles(comment).split())
+        band_hits = Counter()
+        for key in self._band_keys(minhash_signature(shingle_set)):
+            band_hits.update(self._buckets.get(key, ()))
+        best_id, best_similarity = None, self.threshold
+        for entry_id, hits in band_hits.items():
+            if hits < MIN_BAND_HITS:
+                continue
+            entry_shingles, entry_guards, entry_words, _ = self._entries[entry_id]
+            if entry_guards != guards or negated_by_prefix(words, entry_words):
+                continue
+            similarity = jaccard(shingle_set, entry_shingles)
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+        return best_id
+
+    def add(self, comment, value=None):
+        entry_id = self._next_id
+        self._next_id += 1
+        shingle_set = shingles(comment)
+        band_keys = self._band_keys(minhash_signature(shingle_set))
+        guards = (negation_signature(comment), sentiment_signature(comment))
+        self._entries[entry_id] = (shingle_set, guards, set(normalize_for_shingles(comment).split()), band_keys)
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(entry_id)
+        self.values[entry_id] = value
+        return entry_id
+
+    def remove(self, entry_id):
+        _, _, _, band_keys = self._entries.pop(entry_id)
+        for key in band_keys:
+            self._buckets[key].remove(entry_id)
+            if not self._buckets[key]:
+                del self._buckets[key]
+        del self.values[entry_id]
+
+
+TOKEN_PATTERN = re.compile(r"[\w']+")
+
+
+def match_term(term, comment):
+    """Find the aspect term in another comment as whole words: verbatim, or with the same typo corrections as
+    the clustering ("interctive" for "interactive"); None when it is not there."""
+    match = re.search(r"(?<![\w'])" + re.escape(term.strip()) + r"(?![\w'])", comment, re.IGNORECASE)
+    if match:
+        return match.group(0)
+    term_words = normalize_for_shingles(term).split()
+    tokens = list(TOKEN_PATTERN.finditer(comment))
+    words = [canonical_word(token.group(0).lower()) for token in tokens]
+    size = len(term_words)
+    for start in range(len(tokens) - size + 1) if size else ():
+        if words[start:start + size] == term_words:
+            return comment[tokens[start].start():tokens[start + size - 1].end()]
+    return None
+
+
+def propagate_result(result_dict, comment):
+    """Adapt a representative's ABSA result to a near-duplicate comment, re-matching every aspect term.
+    Returns None when a term is not in the comment, so the comment is sent to the LLM itself."""
+    propagated = {}
+    for aspect, aspect_data in result_dict.items():
+        if not isinstance(aspect_data, dict):
+            propagated[aspect] = aspect_data
+            continue
+        terms = aspect_data.get("Aspect Terms")
+        if isinstance(terms, str):
+            terms = [terms]
+        if not terms:
+            propagated[aspect] = dict(aspect_data)
+            continue
+        matched = [match_term(str(term), comment) for term in terms]
+        if None in matched:
+            return None
+        propagated[aspect] = {**aspect_data, "Aspect Terms": matched}
+    return propagated
+
+
+# Pairs that look alike but must never share an answer, checked by running this module
+NEVER_CLUSTERED = [
+    ("her lectures are very interesting and useful", "her lectures are very uninteresting and useful"),
+    ("the teacher is always prepared for the class", "the teacher is always unprepared for the class"),
+    ("she explains the concepts clearly in every lecture", "she explains the concepts unclearly in every lecture"),
+    ("the workload of this course is manageable", "the workload of this course is unmanageable"),
+    ("knowledge is good behavior is bad", "knowledge is bad behavior is good"),
+    ("very good teacher", "not a very good teacher"),
+]
+# Pairs that must cluster, with the representative's terms found again in the follower
+CLUSTERED = [
+    ("humble, interactive, cooperative", "humble ,interctive , cooperative", ["humble", "interactive", "cooperative"]),
+    ("Very humble, cooperative and interactive", "very humble ,cooperative and interactive.", ["humble", "interactive"]),
+]
+
+
+def main():
+    failures = []
+    checks = 0
+    for comment, other in NEVER_CLUSTERED:
+        checks += 1
+        index = NearDuplicateIndex()
+        index.add(comment)
+        if index.find(other) is not None:
+            failures.append(f"clustered: {comment!r} / {other!r}")
+    for comment, other in NEVER_CLUSTERED[:4]:
+        checks += 1
+        term = next(word for word in comment.split() if f"un{word}" in other.split())
+        if match_term(term, other) is not None:
+            failures.append(f"term {term!r} matched in {other!r}")
+    for comment, other, terms in CLUSTERED:
+        checks += 1
+        index = NearDuplicateIndex()
+        index.add(comment)
+        result = {"Behavior": {"Aspect Terms": terms, "Polarity": "Positive"}}
+        if index.find(other) is None or propagate_result(result, other) is None:
+            failures.append(f"not clustered: {comment!r} / {other!r}")
+    for failure in failures:
+        print(failure)
+    print(f"{checks - len(failures)} of {checks} checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # Usage: python -m helpers.near_duplicates   (checks the clustering guards on known pairs)
+    sys.exit(main())
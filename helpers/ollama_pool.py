@@ -0,0 +1,246 @@
+import re
+import time
+import random
+import threading
+from collections.abc import Mapping
+import requests
+
+# =========================================
+# Routing LLM requests over several Ollama hosts
+# =========================================
+# Each request goes to the healthy host with the fewest requests in flight (or a weighted random pick).
+# Hosts that keep failing, answer far slower than the others or stop answering the background health check
+# are ejected for a while. A failed attempt is retried on another host after a short backoff.
+
+
+class OllamaEndpoint:
+    def __init__(self, url, weight=1.0):
+        self.url = url.rstrip("/")
+        self.weight = max(float(weight), 0.01)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # Moving average of successful request seconds
+        self.average_seconds = None
+        self.samples = 0
+        self.ejected_until = 0.0
+        self.eject_reason = None
+        self.ejections = 0
+        # When the host last finished a request or a warm-up, and when a warm-up was last started; None if never
+        self.last_used = None
+        self.warm_up_started = None
+
+    def is_available(self, now):
+        return now >= self.ejected_until
+
+    def snapshot(self, now):
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.is_available(now),
+            "eject_reason": self.eject_reason if not self.is_available(now) else None,
+            "in_flight": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "average_seconds": self.average_seconds,
+        }
+
+
+def parse_keep_alive(value):
+    """Seconds the host keeps the model loaded for an Ollama keep_alive value ("30m", "1h", 300, -1)."""
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    value = str(value).strip()
+    if re.fullmatch(r"-?\d+(\.\d+)?", value):
+        return parse_keep_alive(float(value))
+    if value.startswith("-"):
+        return float("inf")
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        raise ValueError(f"Cannot read keep_alive value '{value}'")
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def parse_endpoints(entries):
+    # Entries are plain URLs or {url, weight} tables from secrets.toml
+    endpoints = []
+    for entry in entries:
+        if isinstance(entry, Mapping):
+            endpoints.append(OllamaEndpoint(entry["url"], entry.get("weight", 1.0)))
+        else:
+            endpoints.append(OllamaEndpoint(str(entry)))
+    if not endpoints:
+        raise ValueError("At least one Ollama endpoint is required")
+    return endpoints
+
+
+class OllamaPool:
+    def __init__(self, endpoints, routing="least_outstanding", connect_timeout=5.0, read_timeout=120.0, max_retries=2,
+                 backoff_seconds=0.5, eject_after_failures=3, eject_seconds=30.0, slow_factor=3.0, min_samples=10,
+                 health_check_seconds=15.0):
+        if routing not in ("least_outstanding", "weighted"):
+            raise ValueError(f"Unknown routing '{routing}', expected 'least_outstanding' or 'weighted'")
+        self.endpoints = parse_endpoints(endpoints)
+        self.routing = routing
+        # requests applies the read timeout to every wait for more bytes, so a stalled stream fails too
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.min_samples = min_samples
+        self.health_check_seconds = health_check_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread = None
+
+    def acquire(self, exclude=()):
+        """Pick the endpoint for the next request and count it as in flight."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or list(self.endpoints)
+            healthy = [endpoint for endpoint in candidates if endpoint.is_available(now)]
+            if not healthy:
+                # Every host is ejected: try the one that comes back first rather than failing the request
+                healthy = [min(candidates, key=lambda endpoint: endpoint.ejected_until)]
+            if self.routing == "weighted":
+                endpoint = random.choices(healthy, weights=[endpoint.weight for endpoint in healthy])[0]
+            else:
+                endpoint = min(healthy, key=lambda e: ((e.outstanding + 1) / e.weight, e.average_seconds or 0.0))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok, seconds=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.last_used = time.monotonic()
+            if not ok:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.eject_after_failures:
+                    self._eject(endpoint, "failing")
+                return
+            endpoint.consecutive_failures = 0
+            if seconds is not None:
+                endpoint.samples += 1
+                endpoint.average_seconds = seconds if endpoint.average_seconds is None else 0.8 * endpoint.average_seconds + 0.2 * seconds
+                if self._is_slow(endpoint):
+                    self._eject(endpoint, "slow")
+
+    def _is_slow(self, endpoint):
+        if endpoint.samples < self.min_samples:
+            return False
+        now = time.monotonic()
+        others = [other.average_seconds for other in self.endpoints
+                  if other is not endpoint and other.is_available(now) and other.samples >= self.min_samples]
+        return bool(others) and endpoint.average_seconds > self.slow_factor * min(others)
+
+    def _eject(self, endpoint, reason):
+        # A single host has nowhere else to send its requests
+        if len(self.endpoints) == 1:
+            return
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+        endpoint.eject_reason = reason
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        # Latency is judged afresh once the host is back
+        endpoint.average_seconds = None
+        endpoint.samples = 0
+        print(f"Ollama endpoint {endpoint.url} ejected for {self.eject_seconds:.0f}s ({reason})")
+
+    def call(self, send):
+        """Run send(url, timeout) -> (reply, metrics) on the best endpoint, retrying on another one if it fails."""
+        self.start_health_checks()
+        tried = []
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff with jitter, so retries of many requests do not arrive together
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            endpoint = self.acquire(exclude=tried)
+            tried.append(endpoint)
+            # A host idle for longer than its keep-alive has to load the model again
+            idle_seconds = time.monotonic() - endpoint.last_used if endpoint.last_used is not None else None
+            start = time.perf_counter()
+            try:
+                reply, metrics = send(endpoint.url, self.timeout)
+            except requests.RequestException as e:
+                self.release(endpoint, ok=False)
+                print(f"Request to {endpoint.url} failed (attempt {attempt + 1}): {e}")
+                error = e
+                continue
+            except Exception:
+                self.release(endpoint, ok=False)
+                raise
+            # Overloaded or broken hosts answer 429 or 5xx; anything else is the model's answer
+            retryable = metrics["status_code"] == 429 or metrics["status_code"] >= 500
+            self.release(endpoint, ok=not retryable, seconds=time.perf_counter() - start)
+            metrics["endpoint"] = endpoint.url
+            metrics["attempts"] = attempt + 1
+            metrics["idle_seconds"] = idle_seconds
+            if not retryable or attempt == self.max_retries:
+                return reply, metrics
+        raise error
+
+    def claim_idle_endpoints(self, max_idle_seconds):
+        """Return the available hosts unused for longer than max_idle_seconds and mark their warm-up as started."""
+        with self._lock:
+            now = time.monotonic()
+            idle = []
+            for endpoint in self.endpoints:
+                # A warm-up started within the window counts as use, so two dispatchers do not both warm a host
+                used = [t for t in (endpoint.last_used, endpoint.warm_up_started) if t is not None]
+                if endpoint.is_available(now) and (not used or now - max(used) > max_idle_seconds):
+                    endpoint.warm_up_started = now
+                    idle.append(endpoint)
+            return idle
+
+    def mark_used(self, endpoint):
+        with self._lock:
+            endpoint.last_used = time.monotonic()
+
+    # ----- health checks -----
+
+    def check_endpoint(self, endpoint):
+        try:
+            return requests.get(f"{endpoint.url}/api/tags", timeout=self.timeout[0]).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def run_health_checks(self):
+        for endpoint in self.endpoints:
+            ok = self.check_endpoint(endpoint)
+            with self._lock:
+                available = endpoint.is_available(time.monotonic())
+                if not ok and available:
+                    self._eject(endpoint, "health check failed")
+                elif ok and not available and endpoint.eject_reason == "health check failed":
+                    # Reachable again. Hosts ejected for failed or slow requests sit out their time, since
+                    # answering /api/tags says nothing about how they handle a chat request
+                    endpoint.ejected_until = 0.0
+                    endpoint.eject_reason = None
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_check_seconds):
+            self.run_health_checks()
+
+    def start_health_checks(self):
+        if self._health_thread is not None or self.health_check_seconds <= 0 or len(self.endpoints) == 1:
+            return
+        with self._lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+                self._health_thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            return [endpoint.snapshot(now) for endpoint in self.endpoints]
+
+    def close(self):
+        self._stop.set()
@@ -1,3 +1,5 @@
+import re
+from functools import lru_cache
 from fpdf import FPDF
 # =========================================
 # Your Original PDF Class (Untouched)
@@ -44,51 +46,63 @@ class PDF(FPDF):
         self.set_font('Arial', '', 10)
 
         for comment, terms, sentiment in zip(comments, aspect_terms, aspect_sentiments):
-            self.set_fill_color(240, 240, 240)
             comment = comment.replace("\n", " ")
-            remaining_text = comment
-            found_term = False  # Flag to track if any aspect term is found
-
-            # Process all terms (but only one sentiment for the aspect)
-            for term in terms.split(","):
-                idx = remaining_text.lower().find(term.lower())
-                if idx != -1:
-                    # Print text before the term
-                    if idx > 0:
-                        normal_text = remaining_text[:idx]
-                        self.set_font('Arial', '', 10)
-                        self.set_text_color(0, 0, 0)
-                        self.multi_cell(0, 5, normal_text, align='L', border=1, fill=True)
-
-                    # Highlight the term
-                    highlighted_text = remaining_text[idx:idx + len(term)]
-                    sentiment = str(sentiment).lower()
-
-                    if sentiment == 'positive':
-                        self.set_text_color(0, 128, 0)
-                    elif sentiment == 'negative':
-                        self.set_text_color(255, 0, 0)
-                    else:
-                        self.set_text_color(255, 165, 0)
-                    # else:
-                    #     self.set_text_color(0, 0, 0)
-
-                    self.set_font('Arial', 'B', 10)
-                    self.multi_cell(0, 5, highlighted_text, align='L', border=1, fill=True)
-                    remaining_text = remaining_text[idx + len(highlighted_text):]  # Update remaining text after the term
-                    found_term = True  # Mark that a term was found
-
-            # After processing all terms, print the remaining text (if any)
-            if found_term and remaining_text:
-                self.set_font('Arial', '', 10)
-                self.set_text_color(0, 0, 0)
-                self.multi_cell(0, 5, remaining_text, align='L', border=1, fill=True)
-            
-            # If no aspect term was found, print the entire comment without highlights
-            elif not found_term:
-                self.set_font('Arial', '', 10)
-                self.set_text_color(0, 0, 0)
-                self.multi_cell(0, 5, remaining_text, align='L', border=1, fill=True)
-            
+            self.add_highlighted_comment(comment, term_pattern(terms), sentiment_color(sentiment))
             self.ln(3)
         self.set_text_color(0, 0, 0) # Reset text color after writing comments
+
+    def add_highlighted_comment(self, comment, pattern, highlight_color, line_height=5):
+        # Lay the comment out as one flowing run of text; only the aspect terms switch to bold and color
+        usable_width = self.w - self.l_margin - self.r_margin
+        estimated_lines = int(self.get_string_width(comment) * 1.1 / usable_width) + 1
+        if self.get_y() + estimated_lines * line_height > self.page_break_trigger:
+            # Keep the comment on one page so its background box can be drawn in one piece
+            self.add_page()
+
+        self.set_fill_color(240, 240, 240)
+        start_page, start_y = self.page, self.get_y()
+        box_insert_at = len(self.pages[self.page])
+
+        pos = 0
+        for match in (pattern.finditer(comment) if pattern is not None else ()):
+            if match.start() > pos:
+                self.set_font('Arial', '', 10)
+                self.set_text_color(0, 0, 0)
+                self.write(line_height, comment[pos:match.start()])
+            self.set_font('Arial', 'B', 10)
+            self.set_text_color(*highlight_color)
+            self.write(line_height, match.group())
+            pos = match.end()
+        if pos < len(comment):
+            self.set_font('Arial', '', 10)
+            self.set_text_color(0, 0, 0)
+            self.write(line_height, comment[pos:])
+        self.ln(line_height)
+
+        if self.page == start_page:
+            # Slip the filled, bordered box into the page stream before the text so it is painted underneath
+            box = '%.2f %.2f %.2f %.2f re B\n' % (
+                self.l_margin * self.k, (self.h - start_y) * self.k,
+                usable_width * self.k, -(self.get_y() - start_y) * self.k
+            )
+            page_content = self.pages[self.page]
+            self.pages[self.page] = page_content[:box_insert_at] + box + page_content[box_insert_at:]
+
+
+def sentiment_color(sentiment):
+    sentiment = str(sentiment).lower()
+    if sentiment == 'positive':
+        return (0, 128, 0)
+    elif sentiment == 'negative':
+        return (255, 0, 0)
+    return (255, 165, 0)
+
+
+@lru_cache(maxsize=4096)
+def term_pattern(terms):
+    """Compile all comma-separated aspect terms into one case-insensitive pattern (longest first)."""
+    term_list = {term.strip() for term in str(terms).split(",")}
+    term_list = sorted((term for term in term_list if term and term.lower() != "none"), key=len, reverse=True)
+    if not term_list:
+        return None
+    return re.compile("|".join(re.escape(term) for term in term_list), re.IGNORECASE)
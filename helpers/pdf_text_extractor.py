@@ -1,53 +1,161 @@
+import io
+import os
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 from PyPDF2 import PdfReader
-import os
-def extract_feedback_from_pdf(pdf_file):
+
+# PDFs longer than this have their pages extracted by a process pool, in chunks of pages_per_task
+parallel_page_threshold = 40
+pages_per_task = 10
+
+_extract_pool = None
+
+
+class CourseBlockParser:
+    """Turns the lines of a feedback PDF into comment rows as they arrive, one course block at a time."""
+
+    def __init__(self, faculty_name):
+        self.faculty_name = faculty_name
+        self.rows = []
+        # A line only counts as a block header when two more lines follow it, so keep two lines of lookahead
+        self._lookahead = deque()
+        self._line_no = 0
+        self._block = None
+
+    def feed(self, line):
+        self._lookahead.append(line)
+        while len(self._lookahead) > 2:
+            self._process(self._lookahead.popleft(), can_be_header=True)
+
+    def finish(self):
+        while self._lookahead:
+            self._process(self._lookahead.popleft(), can_be_header=False)
+        return self.rows
+
+    def _process(self, line, can_be_header):
+        line_no = self._line_no
+        self._line_no += 1
+        lower = line.lower()
+
+        # Step 1: a "class: ... term: ..." line starts a new course block; the next line is the course name
+        if can_be_header and line.strip() and "class:" in lower and "term:" in lower:
+            class_line = line.strip().lower()
+            class_name = None
+            term = None
+            if "class:" in class_line:
+                class_name = class_line.split("class:")[1].strip()
+            if "term:" in class_line:
+                term = class_line.split("term:")[1].split("class")[0].strip()
+            self._block = {
+                "course": self._lookahead[0].strip(),
+                "class": class_name,
+                "term": term,
+                "first_comment_line": line_no + 3,
+            }
+            return
+
+        # Step 2: comments of the current block
+        if self._block is None or line_no < self._block["first_comment_line"]:
+            return
+        line = line.strip()
+        lower = line.lower()
+        if not line or "comments for teacher and course" in lower:
+            return
+        elif any(word in lower for word in ["for teacher", "for course"]):
+            target = "Teacher" if "for teacher" in lower else "Course"
+            comment = lower.split("for teacher")[1].strip() if "for teacher" in lower else lower.split("for course")[1].strip()
+            block = self._block
+            self.rows.append({
+                "FacultyName": self.faculty_name if self.faculty_name else "Unknown",
+                "Course": block["course"] if block["course"] else "Unknown",
+                "Comments": comment,
+                "Target": target,
+                "Class": block["class"] if block["class"] else "Unknown",
+                "Semester": block["term"] if block["term"] else "Unknown",
+            })
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def _get_extract_pool():
+    global _extract_pool
+    if _extract_pool is None:
+        # One pool for the whole server, so workers are started once rather than on every upload;
+        # spawn instead of fork: the Streamlit server is multi-threaded
+        _extract_pool = ProcessPoolExecutor(mp_context=mp.get_context("spawn"))
+    return _extract_pool
+
+
+def iter_page_texts(pdf_file):
+    """Yield the text of every page in order, extracting each page only once."""
+    global _extract_pool
     reader = PdfReader(pdf_file)
-    text = "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
-    lines = text.splitlines()
+    page_count = len(reader.pages)
+    # Pool workers (e.g. from extract_feedback_from_pdfs) already run in parallel
+    if page_count < parallel_page_threshold or mp.parent_process() is not None:
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    pdf_file.seek(0)
+    pdf_bytes = pdf_file.read()
+    starts = list(range(0, page_count, pages_per_task))
+    stops = [min(start + pages_per_task, page_count) for start in starts]
+    pages_done = 0
+    try:
+        # map yields chunks in page order as soon as each one is ready
+        for page_texts in _get_extract_pool().map(_extract_page_range, [pdf_bytes] * len(starts), starts, stops):
+            pages_done += len(page_texts)
+            yield from page_texts
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool next time and extract the remaining pages here
+        _extract_pool = None
+        for page in reader.pages[pages_done:]:
+            yield page.extract_text()
 
-    blocks = []
-    rows = []
-    faculty_name = os.path.splitext(pdf_file.name)[0]
 
-    # Step 1: Identify start indices of each course block
-    for i in range(len(lines) - 2):
-        if not lines[i].strip():
+def iter_document_lines(page_texts):
+    # Same lines as "\n".join(non-empty pages).splitlines(), produced one page at a time
+    previous = None
+    for text in page_texts:
+        if not text:
             continue
-        elif "class:" in lines[i].lower() and "term:" in lines[i].lower():
-            # print(lines[i] + " " + lines[i+1])
-            blocks.append(i)
-
-    # Step 2: Process each block
-    for b in range(len(blocks)):
-        i = blocks[b]
-        next_i = blocks[b + 1] if b + 1 < len(blocks) else len(lines)
-
-        course_name = lines[i+1].strip()
-        class_line = lines[i].strip().lower()
-        
-        # Extract term and class
-        class_name = None
-        term = None
-        if "class:" in class_line:
-            class_name = class_line.split("class:")[1].strip()
-        if "term:" in class_line:
-            term = class_line.split("term:")[1].split("class")[0].strip()
-
-        # Step 3: Process comments in this block
-        for line in lines[i+3:next_i]:
-            line = line.strip()
-            if not line or "comments for teacher and course" in line.lower():
-                continue
-            elif any(word in line.lower() for word in ["for teacher", "for course"]):
-                target = "Teacher" if "for teacher" in line.lower() else "Course"
-                comment = line.lower().split("for teacher")[1].strip() if "for teacher" in line.lower() else line.lower().split("for course")[1].strip()
-                rows.append({
-                    "FacultyName": faculty_name if faculty_name else "Unknown",
-                    "Course": course_name if course_name else "Unknown",
-                    "Comments": comment,
-                    "Target": target,
-                    "Class": class_name if class_name else "Unknown",   
-                    "Semester": term if term else "Unknown",
-                })
-    return pd.DataFrame(rows)
+        if previous is not None:
+            yield from (previous + "\n").splitlines()
+        previous = text
+    if previous is not None:
+        yield from previous.splitlines()
+
+
+def extract_feedback_from_pdf(pdf_file):
+    faculty_name = os.path.splitext(pdf_file.name)[0]
+    parser = CourseBlockParser(faculty_name)
+    for line in iter_document_lines(iter_page_texts(pdf_file)):
+        parser.feed(line)
+    return pd.DataFrame(parser.finish())
+
+
+def _extract_feedback_from_bytes(pdf_bytes, file_name):
+    buffer = io.BytesIO(pdf_bytes)
+    buffer.name = file_name  # the faculty name is taken from the file name
+    return extract_feedback_from_pdf(buffer)
+
+
+def extract_feedback_from_pdfs(named_pdfs):
+    """Extract many teacher PDFs, given as (bytes, file name) pairs, into one dataframe."""
+    global _extract_pool
+    if len(named_pdfs) == 1:
+        return _extract_feedback_from_bytes(*named_pdfs[0])
+    try:
+        frames = list(_get_extract_pool().map(_extract_feedback_from_bytes, *zip(*named_pdfs)))
+    except BrokenProcessPool:
+        _extract_pool = None
+        frames = [_extract_feedback_from_bytes(*named_pdf) for named_pdf in named_pdfs]
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -1,73 +1,128 @@
 import os
-import tempfile
-from helpers.llm_processor import process_teacher_feedback_with_llm
+from helpers.llm_processor import process_teacher_feedback_with_llm, get_ollama_pool
+from helpers.llm_journal import journal_path, load_journal, failed_rows
+from helpers.semester_jobs import is_semester_job_active
+from helpers.result_store import load_teacher_results, import_legacy_csv, teacher_part_path
+from helpers.utils import cache_max_entries, cache_ttl_seconds
+from helpers.aspect_masks import add_aspect_masks
 from helpers.graph_generator import generate_bar_chart, generate_wordcloud
-from helpers.pdf_generator import PDF
+from helpers.report_builder import build_absa_report_pdf, report_path
+from helpers.telemetry import get_session_telemetry, display_diagnostics_panel
+from helpers.history_store import display_trend_view
+from helpers.sentiment_cube import load_cached_semester_cube, cube_version, cube_filter_options, slice_cube
 import streamlit as st
-import pandas as pd
-def sanitize_filename(s):
-    import re
-    return re.sub(r'[<>:"/\\|?*\s]+', '_', s)
-
-def generate_absa_report(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, semester_name):
-    bar_graph_path = generate_bar_chart(teacher_df, selected_aspects)
-    wordcloud_images = generate_wordcloud(teacher_df, selected_aspects)
-
-    wordcloud_paths = []
-    for aspect, wc_img in wordcloud_images:
-        img_path = os.path.join(tempfile.gettempdir(), f"{aspect}_wordcloud.png")
-        wc_img.to_file(img_path)
-        wordcloud_paths.append((aspect, img_path))
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.add_teacher_info(selected_teacher, selected_course, selected_class)
-    total_respondents = teacher_df['Comments'].dropna().count()
-    pdf.add_respondents_info(total_respondents)
-    pdf.add_bar_chart_image(bar_graph_path)
-
-    for aspect, path in wordcloud_paths:
-        aspect_df = teacher_df[
-            teacher_df[f"{aspect}_terms"].fillna("").str.strip().pipe(lambda s: (s != "") & (s.str.lower() != "none"))
-        ]
-        discussed_count = len(aspect_df)
-        pdf.add_aspect_info(aspect, discussed_count, total_respondents, path, aspect_df)
+
+# Cached on its inputs, so the PDF is only rebuilt when the data, the filters or the aspects change
+# (the leading underscore keeps the telemetry out of the cache key)
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner="Building PDF report...")
+def build_cached_absa_report_pdf(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, _telemetry=None):
+    return build_absa_report_pdf(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, _telemetry)
+
+def generate_absa_report(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, semester_name, telemetry,
+                         counts=None):
+    with telemetry.stage("Bar chart"):
+        generate_bar_chart(teacher_df, selected_aspects, counts)
+    with telemetry.stage("Word clouds"):
+        generate_wordcloud(teacher_df, selected_aspects)
 
     os.makedirs("Reports/" + semester_name, exist_ok=True)
-    safe_teacher = sanitize_filename(selected_teacher)
-    safe_course = sanitize_filename(selected_course)
-    safe_class = sanitize_filename(selected_class)
-    pdf_path = os.path.join("Reports", semester_name, f"{safe_teacher}_{safe_course}_{safe_class}.pdf")
+    pdf_path = report_path(semester_name, selected_teacher, selected_course, selected_class)
+
+    # Static images and the PDF are only rendered once someone asks for the report
+    report_key = (semester_name, selected_teacher, selected_course, selected_class, tuple(selected_aspects))
+    if st.session_state.get("requested_report") != report_key:
+        if st.button("Prepare Full Feedback Report (PDF)"):
+            st.session_state["requested_report"] = report_key
+            st.rerun()
+        return
 
     try:
-        pdf.output(pdf_path, dest='F')
+        with telemetry.stage("PDF report"):
+            pdf_bytes = build_cached_absa_report_pdf(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, telemetry)
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_bytes)
         st.success(f"PDF report saved to: {pdf_path}")
     except Exception as e:
         st.error(f"Failed to save PDF report: {e}")
+        return
 
-    with open(pdf_path, "rb") as f:
-        st.download_button("Download Full Feedback Report (PDF)", f, os.path.basename(pdf_path), mime="application/pdf")
+    st.download_button("Download Full Feedback Report (PDF)", pdf_bytes, os.path.basename(pdf_path), mime="application/pdf")
+
+# The part's modification time is part of the key, so a reprocessed teacher is read again
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner=False)
+def load_cached_teacher_results(semester_name, selected_teacher, part_mtime):
+    return load_teacher_results(semester_name, selected_teacher)
 
 def process_and_display_feedback(df, selected_teacher, semester_name, ):
     aspect_categories = ["Teaching Skills", "Knowledge", "Fair in Assessment", "Experience", "Behavior"]
 
-    processed_file_path = f"Datasets/{semester_name}/{selected_teacher}_processed_feedback.csv"
-    if os.path.exists(processed_file_path):
-        teacher_df = pd.read_csv(processed_file_path)
-    else:
-        st.info("Processing feedback with LLM... Please wait ⌛")
+    # Every stage of this run is timed for the diagnostics panel
+    telemetry = get_session_telemetry()
+    telemetry.start_run(f"{selected_teacher} | {semester_name}")
+    # Drawn before the report, whose button reruns the script before the panel is reached
+    show_diagnostics = st.sidebar.checkbox("Show diagnostics")
+
+    journal_file = journal_path(semester_name, selected_teacher)
+    part_path = teacher_part_path(semester_name, selected_teacher)
+    with telemetry.stage("Load results"):
+        if not os.path.exists(part_path):
+            # Results processed before the semester store existed are converted once
+            import_legacy_csv(semester_name, selected_teacher)
+        part_mtime = os.path.getmtime(part_path) if os.path.exists(part_path) else None
+        teacher_df = load_cached_teacher_results(semester_name, selected_teacher, part_mtime)
+
+    if teacher_df is None:
+        if is_semester_job_active(semester_name):
+            # Processing here as well would send the same comments twice
+            st.info(f"{selected_teacher} is queued in the background semester job. Their report appears once it is processed ⌛")
+            return
+        if os.path.exists(journal_file):
+            entries = load_journal(journal_file).values()
+            done_count = sum(1 for entry in entries if entry["status"] == "ok")
+            failed_count = len(entries) - done_count
+            # Failed rows are not sent again on resume; they wait for "Retry failed comments" in the sidebar
+            st.info(f"Resuming interrupted processing: {done_count} comments already done, "
+                    + (f"{failed_count} failed (retry them from the sidebar), " if failed_count else "")
+                    + "only the missing ones will be sent to the LLM ⌛")
+        else:
+            st.info("Processing feedback with LLM... Please wait ⌛")
         teacher_dfRaw = df[df['FacultyName'] == selected_teacher].copy()
-        teacher_df = process_teacher_feedback_with_llm(teacher_dfRaw, selected_teacher, semester_name, aspect_categories)
+        with telemetry.stage("LLM processing"):
+            teacher_df = process_teacher_feedback_with_llm(teacher_dfRaw, selected_teacher, semester_name, aspect_categories, telemetry=telemetry)
         st.success("Processing complete ✅")
 
+    # Rows the LLM could not answer stay in the journal until they are retried on their own
+    failed = failed_rows(journal_file)
+    if failed:
+        st.sidebar.warning(f"{len(failed)} comments could not be processed by the LLM.")
+        if st.sidebar.button("Retry failed comments"):
+            teacher_dfRaw = df[df['FacultyName'] == selected_teacher].copy()
+            with telemetry.stage("LLM retry of failed comments"):
+                teacher_df = process_teacher_feedback_with_llm(teacher_dfRaw, selected_teacher, semester_name, aspect_categories,
+                                                               retry_failed=True, telemetry=telemetry)
+
+    # Computed once here and reused by the chart, the word clouds and every PDF section
+    with telemetry.stage("Aspect masks"):
+        teacher_df = add_aspect_masks(teacher_df, aspect_categories)
+
+
+    # Filter options and chart counts are looked up in the semester's aspect x sentiment cube
+    with telemetry.stage("Sentiment cube"):
+        cube = load_cached_semester_cube(semester_name, cube_version(semester_name))
+        if cube is not None and selected_teacher not in cube.index.get_level_values("FacultyName"):
+            cube = None
 
     selected_aspects = st.sidebar.multiselect("Select Aspects to Include in Report", options=aspect_categories, default=aspect_categories)
 
-    selected_course = st.sidebar.selectbox("Select a Course (Optional)", ['All'] + sorted(teacher_df['Course'].unique()))
+    course_options = cube_filter_options(cube, selected_teacher) if cube is not None else sorted(teacher_df['Course'].unique())
+    selected_course = st.sidebar.selectbox("Select a Course (Optional)", ['All'] + course_options)
     selected_class = "All"
 
     if selected_course != 'All':
-        class_options = sorted(teacher_df[teacher_df['Course'] == selected_course]['Class'].astype(str).unique())
+        if cube is not None:
+            class_options = cube_filter_options(cube, selected_teacher, selected_course)
+        else:
+            class_options = sorted(teacher_df[teacher_df['Course'] == selected_course]['Class'].astype(str).unique())
         selected_class = st.sidebar.selectbox("Select a Class (Optional)", ['All'] + class_options)
 
         if selected_class != 'All':
@@ -79,4 +134,10 @@ def process_and_display_feedback(df, selected_teacher, semester_name, ):
     else:
         st.markdown(f"### Feedback Report for {selected_teacher} | **Semester: {semester_name}**")  
 
-    generate_absa_report(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, semester_name)
+    counts = slice_cube(cube, selected_teacher, selected_course, selected_class) if cube is not None else None
+    generate_absa_report(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, semester_name, telemetry,
+                         counts)
+    with telemetry.stage("Semester trends"):
+        display_trend_view(selected_teacher, aspect_categories)
+    if show_diagnostics:
+        display_diagnostics_panel(telemetry, get_ollama_pool().snapshot())
@@ -0,0 +1,43 @@
+import os
+from helpers.utils import sanitize_filename
+from helpers.aspect_masks import aspect_mask
+from helpers.graph_generator import build_bar_chart_figure, submit_bar_chart_export
+from helpers.wordcloud_engine import render_wordclouds
+from helpers.pdf_generator import PDF
+from helpers.telemetry import timed_stage
+
+# =========================================
+# PDF report assembly, shared by the dashboard and the bulk exporter
+# =========================================
+
+def report_path(semester_name, selected_teacher, selected_course, selected_class):
+    safe_teacher = sanitize_filename(selected_teacher)
+    safe_course = sanitize_filename(selected_course)
+    safe_class = sanitize_filename(selected_class)
+    return os.path.join("Reports", semester_name, f"{safe_teacher}_{safe_course}_{safe_class}.pdf")
+
+
+def build_absa_report_pdf(teacher_df, selected_teacher, selected_course, selected_class, selected_aspects, telemetry=None):
+    # The chart export runs in the background while the word clouds are prepared
+    bar_graph_future = submit_bar_chart_export(build_bar_chart_figure(teacher_df, selected_aspects))
+    # Already rendered and cached on disk when the page showed them
+    with timed_stage(telemetry, "Report: word clouds"):
+        wordcloud_paths = render_wordclouds(teacher_df, selected_aspects)
+    with timed_stage(telemetry, "Report: chart image export (kaleido)"):
+        bar_graph_path = bar_graph_future.result()
+
+    with timed_stage(telemetry, "Report: PDF assembly (FPDF)"):
+        pdf = PDF()
+        pdf.add_page()
+        pdf.add_teacher_info(selected_teacher, selected_course, selected_class)
+        total_respondents = teacher_df['Comments'].dropna().count()
+        pdf.add_respondents_info(total_respondents)
+        pdf.add_bar_chart_image(bar_graph_path)
+
+        for aspect, path in wordcloud_paths:
+            aspect_df = teacher_df[aspect_mask(teacher_df, aspect)]
+            discussed_count = len(aspect_df)
+            pdf.add_aspect_info(aspect, discussed_count, total_respondents, path, aspect_df)
+
+        # FPDF 1.7 returns the document as a latin-1 string
+        return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,114 @@
+import os
+import sys
+import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from helpers.utils import sanitize_filename
+
+# =========================================
+# Columnar per-semester store of processed feedback
+# =========================================
+# Each semester is one Parquet dataset under Datasets/<semester>/results, written as one part file per
+# teacher so the foreground app and the semester worker never rewrite each other's rows. Loading one teacher
+# reads only their own part file.
+
+CATEGORICAL_COLUMNS = ["FacultyName", "Course", "Class", "Target", "Semester"]
+
+
+def semester_store_path(semester_name):
+    return os.path.join("Datasets", semester_name, "results")
+
+
+def teacher_part_path(semester_name, selected_teacher):
+    return os.path.join(semester_store_path(semester_name), f"{sanitize_filename(selected_teacher)}.parquet")
+
+
+def legacy_csv_path(semester_name, selected_teacher):
+    return f"Datasets/{semester_name}/{selected_teacher}_processed_feedback.csv"
+
+
+def _to_storage_table(teacher_df):
+    # Everything is stored as text so every part file shares one schema; dtypes are restored on load
+    stored = teacher_df.reset_index(drop=True).astype(object)
+    stored = stored.where(stored.isna(), stored.astype(str)).where(stored.notna(), None)
+    schema = pa.schema([(col, pa.string()) for col in stored.columns])
+    return pa.Table.from_pandas(stored, schema=schema, preserve_index=False)
+
+
+def _restore_dtypes(results_df):
+    for col in results_df.columns:
+        if col in CATEGORICAL_COLUMNS or col.endswith("_polarity"):
+            results_df[col] = results_df[col].astype("category")
+    return results_df
+
+
+def has_teacher_results(semester_name, selected_teacher):
+    return os.path.exists(teacher_part_path(semester_name, selected_teacher))
+
+
+def save_teacher_results(semester_name, selected_teacher, teacher_df):
+    path = teacher_part_path(semester_name, selected_teacher)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a reader never sees a half-written part; dot files are never read as parts
+    tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    pq.write_table(_to_storage_table(teacher_df), tmp_path)
+    os.replace(tmp_path, path)
+    # The teacher's aspect x sentiment counts are rebuilt with their rows; the other teachers' stay as they are
+    from helpers.sentiment_cube import save_cube_part
+    save_cube_part(semester_name, os.path.basename(path), teacher_df)
+    return path
+
+
+def _read_parts(paths, columns=None):
+    # Parts may differ in their columns (older runs, legacy CSVs, uploads without Semester), so they are read
+    # under the union of their schemas; a column a part lacks comes back empty instead of being dropped
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+    if columns is not None:
+        columns = [col for col in columns if col in schema.names]
+    return pq.read_table(paths, schema=schema, columns=columns).to_pandas()
+
+
+def load_teacher_results(semester_name, selected_teacher, columns=None):
+    """Load one teacher's part of the semester store, or None if they have not been processed."""
+    if not has_teacher_results(semester_name, selected_teacher):
+        return None
+    return _restore_dtypes(_read_parts([teacher_part_path(semester_name, selected_teacher)], columns))
+
+
+def load_semester_results(semester_name, columns=None):
+    parts = sorted(glob.glob(os.path.join(semester_store_path(semester_name), "*.parquet")))
+    if not parts:
+        return None
+    return _restore_dtypes(_read_parts(parts, columns))
+
+
+def import_legacy_csv(semester_name, selected_teacher):
+    """Move a teacher's old processed CSV into the semester store; returns False if there is none."""
+    csv_path = legacy_csv_path(semester_name, selected_teacher)
+    if not os.path.exists(csv_path):
+        return False
+    save_teacher_results(semester_name, selected_teacher, pd.read_csv(csv_path))
+    return True
+
+
+def import_legacy_semester(semester_name):
+    # One-time conversion of every <teacher>_processed_feedback.csv of a semester
+    imported = []
+    suffix = "_processed_feedback.csv"
+    for csv_path in sorted(glob.glob(os.path.join("Datasets", semester_name, f"*{suffix}"))):
+        selected_teacher = os.path.basename(csv_path)[:-len(suffix)]
+        if not has_teacher_results(semester_name, selected_teacher):
+            import_legacy_csv(semester_name, selected_teacher)
+            imported.append(selected_teacher)
+    return imported
+
+
+if __name__ == "__main__":
+    # Usage: python -m helpers.result_store [semester ...]   (all semesters under Datasets/ by default)
+    semesters = sys.argv[1:] or sorted(
+        name for name in os.listdir("Datasets") if os.path.isdir(os.path.join("Datasets", name))
+    )
+    for semester in semesters:
+        imported = import_legacy_semester(semester)
+        print(f"{semester}: imported {len(imported)} teachers")
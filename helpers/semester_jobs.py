@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import subprocess
+import pandas as pd
+import streamlit as st
+
+# =========================================
+# Background processing of a whole semester
+# =========================================
+# Jobs run in one long-lived worker process fed by a queue, so they keep going across Streamlit
+# reruns and page reloads. Progress is written to a status file that any session can poll.
+# The worker is a separate interpreter running this module, so it never imports the app script; each
+# job is one line on its stdin, with the semester's rows saved next to the status file.
+
+_worker = None
+_worker_lock = threading.Lock()
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def status_path(semester_name):
+    return f"Datasets/{semester_name}/semester_job_status.json"
+
+
+def input_path(semester_name):
+    return f"Datasets/{semester_name}/semester_job_input.parquet"
+
+
+def read_job_status(semester_name):
+    path = status_path(semester_name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_status(semester_name, status):
+    path = status_path(semester_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    status["updated"] = time.time()
+    # Write then rename so a polling session never reads a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def run_semester_job(df, semester_name, aspects):
+    """Process every teacher of a semester upload through one shared LLM dispatcher."""
+    from helpers.llm_processor import (LLMDispatcher, analyze_teacher_feedback, model_name, llm_concurrency,
+                                       llm_near_duplicates, llm_near_duplicate_threshold)
+    from helpers.near_duplicates import NearDuplicateIndex
+    from helpers.result_store import has_teacher_results, import_legacy_csv
+
+    teachers = sorted(df['FacultyName'].dropna().unique())
+    status = {
+        "semester": semester_name,
+        "state": "running",
+        "teachers": {teacher: {"state": "pending", "done": 0, "total": 0, "failed": 0} for teacher in teachers},
+    }
+    _write_status(semester_name, status)
+    # One index for the whole semester, so near-duplicate comments are sent once across all teachers
+    near_duplicates = NearDuplicateIndex(llm_near_duplicate_threshold) if llm_near_duplicates else None
+
+    with LLMDispatcher(model_name, max_workers=llm_concurrency) as dispatcher:
+        for teacher in teachers:
+            teacher_status = status["teachers"][teacher]
+            if has_teacher_results(semester_name, teacher) or import_legacy_csv(semester_name, teacher):
+                teacher_status["state"] = "done"
+                _write_status(semester_name, status)
+                continue
+
+            teacher_status["state"] = "running"
+            _write_status(semester_name, status)
+            last_write = [0.0]
+
+            def update_progress(done_count, total):
+                teacher_status["done"] = done_count
+                teacher_status["total"] = total
+                # Throttle status writes; the UI polls every few seconds anyway
+                if time.time() - last_write[0] > 1.0 or done_count == total:
+                    _write_status(semester_name, status)
+                    last_write[0] = time.time()
+
+            try:
+                teacher_df = df[df['FacultyName'] == teacher].copy()
+                _, run_stats = analyze_teacher_feedback(
+                    teacher_df, teacher, semester_name, aspects, dispatcher=dispatcher, progress_callback=update_progress,
+                    near_duplicates=near_duplicates
+                )
+                teacher_status["state"] = "done"
+                teacher_status["failed"] = run_stats["failed"]
+                teacher_status["fast_path"] = run_stats["fast_path"]
+                teacher_status["near_duplicates"] = run_stats["near_duplicates"]
+                teacher_status["repaired"] = run_stats["repaired"]
+            except Exception as e:
+                print(f"Semester job failed for {teacher}: {e}")
+                teacher_status["state"] = "failed"
+                teacher_status["error"] = str(e)
+            _write_status(semester_name, status)
+
+    status["state"] = "done"
+    _write_status(semester_name, status)
+
+
+def _worker_loop(job_lines):
+    # Ends when the app closes the worker's stdin
+    for line in job_lines:
+        job = json.loads(line)
+        semester_name = job["semester"]
+        try:
+            df = pd.read_parquet(input_path(semester_name))
+            run_semester_job(df, semester_name, job["aspects"])
+        except Exception as e:
+            print(f"Semester job for {semester_name} failed: {e}")
+            status = read_job_status(semester_name) or {"semester": semester_name, "teachers": {}}
+            status["state"] = "failed"
+            status["error"] = str(e)
+            _write_status(semester_name, status)
+        finally:
+            if os.path.exists(input_path(semester_name)):
+                os.remove(input_path(semester_name))
+
+
+def is_semester_job_active(semester_name):
+    status = read_job_status(semester_name)
+    worker_alive = _worker is not None and _worker.poll() is None
+    # A status file left "running" by a server that has since restarted is not an active job
+    return worker_alive and status is not None and status["state"] in ("queued", "running")
+
+
+def _start_worker():
+    # python -m helpers.semester_jobs from wherever the app runs, so the relative Datasets/ paths still match
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_repo_root, env.get("PYTHONPATH")]))
+    worker = subprocess.Popen([sys.executable, "-m", "helpers.semester_jobs"], stdin=subprocess.PIPE, text=True, env=env)
+    # Stop the worker with the server, as the daemon process it replaces did
+    atexit.register(worker.terminate)
+    return worker
+
+
+def submit_semester_job(df, semester_name, aspects):
+    global _worker
+    if is_semester_job_active(semester_name):
+        return False
+    _write_status(semester_name, {"semester": semester_name, "state": "queued", "teachers": {}})
+    df.to_parquet(input_path(semester_name))
+    with _worker_lock:
+        if _worker is None or _worker.poll() is not None:
+            _worker = _start_worker()
+        _worker.stdin.write(json.dumps({"semester": semester_name, "aspects": list(aspects)}) + "\n")
+        _worker.stdin.flush()
+    return True
+
+
+def display_semester_job_status(semester_name):
+    active = is_semester_job_active(semester_name)
+
+    # Re-run only this panel every few seconds while the job is still going
+    @st.fragment(run_every=5 if active else None)
+    def job_status_panel():
+        status = read_job_status(semester_name)
+        if status is None:
+            return
+        teachers = status.get("teachers", {})
+        finished = sum(1 for t in teachers.values() if t["state"] in ("done", "failed"))
+        with st.expander(f"Semester job: {status['state']} ({finished}/{len(teachers)} teachers)", expanded=active):
+            if status.get("error"):
+                st.error(status["error"])
+            for teacher, teacher_status in teachers.items():
+                if teacher_status["state"] == "running" and teacher_status["total"]:
+                    st.progress(teacher_status["done"] / teacher_status["total"], text=teacher)
+                else:
+                    label = teacher_status["state"]
+                    if teacher_status.get("fast_path"):
+                        label += f", {teacher_status['fast_path']} resolved locally"
+                    if teacher_status.get("near_duplicates"):
+                        label += f", {teacher_status['near_duplicates']} near duplicates"
+                    if teacher_status.get("repaired"):
+                        label += f", {teacher_status['repaired']} repaired"
+                    if teacher_status.get("failed"):
+                        label += f", {teacher_status['failed']} failed comments"
+                    st.caption(f"{teacher}: {label}")
+
+    # Fragments cannot call st.sidebar themselves, so the whole panel is placed there
+    with st.sidebar:
+        job_status_panel()
+
+
+if __name__ == "__main__":
+    # Started by submit_semester_job: one JSON job per line on stdin, {"semester": ..., "aspects": [...]}
+    _worker_loop(sys.stdin)
@@ -0,0 +1,156 @@
+import os
+import glob
+import pandas as pd
+import streamlit as st
+from helpers.aspect_masks import aspect_mask
+from helpers.result_store import semester_store_path
+from helpers.utils import cache_max_entries, cache_ttl_seconds
+
+# =========================================
+# Aspect x sentiment counts per teacher, course and class
+# =========================================
+# Each teacher's processed results are reduced to one small table of counts, stored next to the result part as
+# Datasets/<semester>/cube/<teacher>.parquet and rewritten whenever that part is. The chart of any teacher,
+# course or class, and the department overview, are then sums over an index slice instead of row filters.
+
+CUBE_KEYS = ["FacultyName", "Course", "Class"]
+CUBE_INDEX = CUBE_KEYS + ["Aspect", "Polarity"]
+SENTIMENT_TYPES = ['Positive', 'Neutral', 'Negative']
+# Rows of the cube that count every response, whether or not it discusses an aspect
+RESPONSES = "__responses__"
+
+
+def cube_store_path(semester_name):
+    return os.path.join("Datasets", semester_name, "cube")
+
+
+def build_cube(results_df):
+    """Count responses, and comments per aspect and polarity, for every teacher, course and class."""
+    # Parts without a course or class column count under an empty one
+    keys = results_df.reindex(columns=CUBE_KEYS).astype(object).fillna("").astype(str)
+    frames = [keys.value_counts().rename("Count").reset_index().assign(Aspect=RESPONSES, Polarity="")]
+    aspects = [col[:-len("_terms")] for col in results_df.columns if col.endswith("_terms")]
+    for aspect in aspects:
+        discussed = aspect_mask(results_df, aspect)
+        polarity = results_df.loc[discussed, f"{aspect}_polarity"].astype(object).fillna("None").astype(str)
+        counts = pd.concat([keys[discussed], polarity.rename("Polarity")], axis=1).value_counts()
+        frames.append(counts.rename("Count").reset_index().assign(Aspect=aspect))
+    cube = pd.concat(frames, ignore_index=True)[CUBE_INDEX + ["Count"]]
+    cube["Count"] = cube["Count"].astype("int64")
+    return cube
+
+
+def index_cube(cube_df):
+    # Counts on a sorted (teacher, course, class, aspect, polarity) index, so slices are index lookups
+    return cube_df.groupby(CUBE_INDEX, observed=True)["Count"].sum().sort_index()
+
+
+def save_cube_part(semester_name, part_name, results_df):
+    path = os.path.join(cube_store_path(semester_name), part_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), "." + part_name + ".tmp")
+    build_cube(results_df).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def refresh_semester_cube(semester_name):
+    # Parts written before the cube existed, or by an older run, are rebuilt from their result part
+    for results_part in glob.glob(os.path.join(semester_store_path(semester_name), "*.parquet")):
+        part_name = os.path.basename(results_part)
+        cube_part = os.path.join(cube_store_path(semester_name), part_name)
+        if not os.path.exists(cube_part) or os.path.getmtime(cube_part) < os.path.getmtime(results_part):
+            save_cube_part(semester_name, part_name, pd.read_parquet(results_part))
+
+
+def cube_version(semester_name):
+    # Changes whenever a result part is added or rewritten, so cached cubes are reloaded
+    parts = glob.glob(os.path.join(semester_store_path(semester_name), "*.parquet"))
+    return len(parts), max((os.path.getmtime(part) for part in parts), default=None)
+
+
+def load_semester_cube(semester_name):
+    """The semester's counts as a Series on a sorted (teacher, course, class, aspect, polarity) index, or None."""
+    refresh_semester_cube(semester_name)
+    parts = glob.glob(os.path.join(cube_store_path(semester_name), "*.parquet"))
+    if not parts:
+        return None
+    return index_cube(pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True))
+
+
+@st.cache_data(max_entries=cache_max_entries, ttl=cache_ttl_seconds, show_spinner=False)
+def load_cached_semester_cube(semester_name, version):
+    return load_semester_cube(semester_name)
+
+
+def slice_cube(cube, selected_teacher=None, selected_course="All", selected_class="All"):
+    """Sum the cube over everything not selected; returns counts indexed by (aspect, polarity)."""
+    key = tuple(value for value in (selected_teacher, selected_course, selected_class) if value not in (None, "All"))
+    # Course and class are only selected below a teacher, so the key is always a prefix of the index
+    try:
+        selected = cube.loc[key] if key else cube
+    except KeyError:
+        selected = cube.iloc[:0]
+    return selected.groupby(level=["Aspect", "Polarity"]).sum()
+
+
+def cube_chart_data(counts, aspect_categories):
+    """Count and percentage of each sentiment per aspect, as the bar charts show them."""
+    rows = []
+    for aspect in aspect_categories:
+        aspect_counts = counts.loc[aspect] if aspect in counts.index.get_level_values("Aspect") else pd.Series(dtype="int64")
+        discussed = int(aspect_counts.sum())
+        for sentiment in SENTIMENT_TYPES:
+            count = int(aspect_counts.get(sentiment, 0))
+            rows.append({
+                'Aspect': aspect,
+                'Sentiment': sentiment,
+                'Count': count,
+                'Percentage': count / discussed * 100 if discussed > 0 else 0,
+            })
+    return pd.DataFrame(rows)
+
+
+def total_responses(counts):
+    return int(counts.loc[RESPONSES].sum()) if RESPONSES in counts.index.get_level_values("Aspect") else 0
+
+
+def cube_filter_options(cube, selected_teacher, selected_course="All"):
+    # Courses of a teacher, or classes of one of their courses, straight from the index
+    teacher_cube = cube.loc[selected_teacher]
+    if selected_course == "All":
+        return sorted(teacher_cube.index.get_level_values("Course").unique())
+    return sorted(teacher_cube.loc[selected_course].index.get_level_values("Class").unique())
+
+
+# =========================================
+# Department overview
+# =========================================
+
+def department_summary(cube, aspect_categories):
+    """One row per processed teacher: responses and the positive share of each aspect."""
+    per_teacher = cube.groupby(level=["FacultyName", "Aspect", "Polarity"]).sum()
+    rows = []
+    for teacher in per_teacher.index.get_level_values("FacultyName").unique():
+        counts = per_teacher.loc[teacher]
+        row = {"Teacher": teacher, "Responses": total_responses(counts)}
+        for aspect in aspect_categories:
+            chart = cube_chart_data(counts, [aspect])
+            row[f"{aspect} positive %"] = round(chart.loc[chart['Sentiment'] == 'Positive', 'Percentage'].iloc[0], 1)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def display_department_overview(semester_name, aspect_categories, teacher_count=None):
+    from helpers.graph_generator import build_counts_figure
+    cube = load_cached_semester_cube(semester_name, cube_version(semester_name))
+    if cube is None:
+        return
+    with st.expander("Department overview (all processed teachers)"):
+        processed = cube.index.get_level_values("FacultyName").nunique()
+        if teacher_count:
+            st.caption(f"{processed} of {teacher_count} teachers processed so far.")
+        counts = slice_cube(cube)
+        st.plotly_chart(build_counts_figure(cube_chart_data(counts, aspect_categories), total_responses(counts)),
+                        use_container_width=True)
+        st.dataframe(department_summary(cube, aspect_categories), hide_index=True, use_container_width=True)
@@ -0,0 +1,147 @@
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+import streamlit as st
+
+# =========================================
+# Stage timings and per-request LLM metrics
+# =========================================
+# One Telemetry object lives in each Streamlit session. Stages are timed around the steps of a dashboard
+# run; LLM requests are recorded from the dispatcher's worker threads, so every append takes the lock.
+
+# Duration fields Ollama reports in nanoseconds, and its token counts
+OLLAMA_METRIC_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+max_stage_records = 1000
+max_llm_records = 20000
+
+
+class Telemetry:
+    def __init__(self):
+        self.run = 0
+        self.run_label = None
+        self.stages = []
+        self.llm_requests = []
+        self._lock = threading.Lock()
+
+    def start_run(self, label):
+        """Start a new dashboard run; later stages are tagged with it."""
+        with self._lock:
+            self.run += 1
+            self.run_label = label
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"run": self.run, "label": self.run_label, "stage": name,
+                      "seconds": time.perf_counter() - start, "finished": time.time()}
+            with self._lock:
+                self.stages.append(record)
+                del self.stages[:-max_stage_records]
+
+    def record_llm_request(self, metrics):
+        record = {"run": self.run, "label": self.run_label, "finished": time.time(), **metrics}
+        with self._lock:
+            self.llm_requests.append(record)
+            del self.llm_requests[:-max_llm_records]
+
+    def stages_df(self, run=None):
+        with self._lock:
+            stages_df = pd.DataFrame(self.stages)
+        if run is not None and not stages_df.empty:
+            stages_df = stages_df[stages_df["run"] == run]
+        return stages_df
+
+    def llm_requests_df(self):
+        with self._lock:
+            return pd.DataFrame(self.llm_requests)
+
+    def llm_summary(self):
+        requests_df = self.llm_requests_df()
+        warm_ups = requests_df[requests_df["warm_up"] == True] if "warm_up" in requests_df else requests_df.iloc[:0]
+        requests_df = requests_df.drop(warm_ups.index)
+        # Model loads are reported on their own, whether a warm-up or a comment waited for them
+        summary = {"warm_ups": len(warm_ups)}
+        if "load_duration" in warm_ups and warm_ups["load_duration"].notna().any():
+            summary["warm_up_load_seconds_max"] = warm_ups["load_duration"].max() / 1e9
+        if requests_df.empty:
+            summary["requests"] = 0
+            return summary
+        summary.update({
+            "requests": len(requests_df),
+            "errors": int((requests_df["status_code"] != 200).sum()),
+            "wall_seconds_p50": requests_df["wall_seconds"].median(),
+            "wall_seconds_p95": requests_df["wall_seconds"].quantile(0.95),
+        })
+        if "first_token_seconds" in requests_df:
+            summary["first_token_seconds_p50"] = requests_df["first_token_seconds"].median()
+        for field in ("prompt_eval_count", "eval_count"):
+            if field in requests_df:
+                summary[f"{field}_total"] = int(requests_df[field].fillna(0).sum())
+        if "eval_duration" in requests_df and requests_df["eval_duration"].notna().any():
+            timed = requests_df[requests_df["eval_duration"].notna()]
+            summary["generation_tokens_per_second"] = timed["eval_count"].sum() / (timed["eval_duration"].sum() / 1e9)
+
+        # Requests that waited for the model to load are kept out of the steady-state latency
+        if "cold_start" in requests_df:
+            cold = requests_df[requests_df["cold_start"] == True]
+            steady = requests_df.drop(cold.index)
+            summary["cold_starts"] = len(cold)
+            if "cold_start_estimated" in requests_df:
+                # Judged from host idle time because the reply was cut off before Ollama reported the load time
+                summary["cold_starts_estimated"] = int((cold["cold_start_estimated"] == True).sum())
+            if not cold.empty:
+                summary["cold_start_wall_seconds_p50"] = cold["wall_seconds"].median()
+            if not steady.empty:
+                summary["steady_wall_seconds_p50"] = steady["wall_seconds"].median()
+                summary["steady_wall_seconds_p95"] = steady["wall_seconds"].quantile(0.95)
+            if "load_duration" in cold and cold["load_duration"].notna().any():
+                summary["cold_start_load_seconds_p50"] = cold["load_duration"].median() / 1e9
+        return summary
+
+    def to_json(self):
+        with self._lock:
+            payload = {"stages": list(self.stages), "llm_requests": list(self.llm_requests)}
+        payload["llm_summary"] = self.llm_summary()
+        return json.dumps(payload, indent=2, default=float)
+
+
+def timed_stage(telemetry, name):
+    # Helpers shared with the bulk exporter run without telemetry
+    return telemetry.stage(name) if telemetry is not None else nullcontext()
+
+
+def get_session_telemetry():
+    if "telemetry" not in st.session_state:
+        st.session_state["telemetry"] = Telemetry()
+    return st.session_state["telemetry"]
+
+
+def display_diagnostics_panel(telemetry, endpoint_stats=None):
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        stages_df = telemetry.stages_df(run=telemetry.run)
+        st.markdown(f"**Stage timings** ({telemetry.run_label})")
+        if stages_df.empty:
+            st.caption("No stages recorded yet.")
+        else:
+            st.dataframe(stages_df[["stage", "seconds"]].round(3), hide_index=True, use_container_width=True)
+
+        st.markdown("**LLM requests** (this session)")
+        summary = telemetry.llm_summary()
+        if summary["requests"] == 0 and not summary["warm_ups"]:
+            st.caption("No LLM requests sent yet.")
+        else:
+            st.dataframe(pd.Series(summary, name="value").round(3), use_container_width=True)
+
+        if endpoint_stats:
+            st.markdown("**Ollama endpoints**")
+            st.dataframe(pd.DataFrame(endpoint_stats).round(3), hide_index=True, use_container_width=True)
+
+        st.download_button("Stage timings (CSV)", telemetry.stages_df().to_csv(index=False), "stage_timings.csv", mime="text/csv")
+        st.download_button("LLM requests (CSV)", telemetry.llm_requests_df().to_csv(index=False), "llm_requests.csv", mime="text/csv")
+        st.download_button("All diagnostics (JSON)", telemetry.to_json(), "diagnostics.json", mime="application/json")
@@ -2,6 +2,14 @@ import re
 import json
 import textwrap
 
+# Limits of the Streamlit caches: least recently used entries are evicted past max_entries,
+# and every entry expires after the TTL so stale figures and reports do not pile up in memory
+cache_max_entries = 32
+cache_ttl_seconds = 3600
+
+def sanitize_filename(s):
+    return re.sub(r'[<>:"/\\|?*\s]+', '_', s)
+
 # Helper function to wrap text
 def wrap_text(text, width=80):
     return "<br>".join(textwrap.wrap(text, width=width))
@@ -29,4 +37,36 @@ def parse_json_safe(response_text):
 
     except Exception as e:
         print(f"JSON parsing failed: {e}\nRaw response: {response_text}")
-        return None
\ No newline at end of file
+        return None
+
+
+# Tracks brace depth over streamed text to tell when the first top-level JSON object is complete
+class JsonObjectTracker:
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.length = 0
+
+    def feed(self, text):
+        """Consume a chunk; return the end offset of the object in the whole stream once it closes, else -1."""
+        for pos, ch in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.started:
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.length + pos + 1
+        self.length += len(text)
+        return -1
@@ -0,0 +1,97 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import multiprocessing as mp
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from wordcloud import WordCloud, STOPWORDS
+from helpers.aspect_masks import aspect_mask
+
+# =========================================
+# Frequency-based word cloud rendering with an image cache
+# =========================================
+
+negation_words = {"not", "no", "never", "cannot", "can't", "doesn't", "won't", "don't", "didn't"}
+
+# Built once per process instead of on every call
+WORDCLOUD_STOPWORDS = frozenset(set(STOPWORDS).difference(negation_words).union({
+    "teacher", "ma'am", "sir", "miss", "mr", "mam", "mrs", "teaches", "student", "teach",
+    "classroom", "good", "us", "mentioned", "course", "subject", "class", "students",
+    "teaching", "semester", "faculty", "professor", "experience", "knowledge", "behavior", "pedagogy"
+}))
+
+# Same token rule WordCloud applies when it is given raw text
+TOKEN_PATTERN = re.compile(r"\w[\w']+")
+
+WORDCLOUD_OPTIONS = {"width": 800, "height": 400, "background_color": "white"}
+wordcloud_cache_dir = os.path.join(tempfile.gettempdir(), "feedback_report_images")
+
+_render_pool = None
+
+
+def term_frequencies(teacher_df, aspect_categories):
+    """Tokenize the aspect terms once and return a frequency table per aspect that has any words left."""
+    tables = {}
+    for aspect in aspect_categories:
+        terms = teacher_df.loc[aspect_mask(teacher_df, aspect), f"{aspect}_terms"]
+        if terms.empty:
+            continue
+        tokens = TOKEN_PATTERN.findall(" ".join(terms.astype(str)).lower())
+        frequencies = Counter(token for token in tokens if token not in WORDCLOUD_STOPWORDS and not token.isdigit())
+        if frequencies:
+            tables[aspect] = frequencies
+    return tables
+
+
+def wordcloud_image_path(frequencies):
+    # Identical frequency tables always give the same file, whichever teacher or filter produced them
+    payload = json.dumps([sorted(frequencies.items()), WORDCLOUD_OPTIONS])
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(wordcloud_cache_dir, f"wordcloud_{digest}.png")
+
+
+def render_wordcloud(frequencies, image_path):
+    wordcloud = WordCloud(**WORDCLOUD_OPTIONS).generate_from_frequencies(frequencies)
+    tmp_path = image_path + f".{os.getpid()}.tmp.png"
+    wordcloud.to_file(tmp_path)
+    os.replace(tmp_path, image_path)
+    return image_path
+
+
+def _get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        # spawn instead of fork: the Streamlit server is multi-threaded
+        _render_pool = ProcessPoolExecutor(max_workers=min(5, os.cpu_count() or 1), mp_context=mp.get_context("spawn"))
+    return _render_pool
+
+
+def render_wordclouds(teacher_df, aspect_categories):
+    """Return [(aspect, image_path)], rendering only the word clouds that are not cached yet."""
+    global _render_pool
+    os.makedirs(wordcloud_cache_dir, exist_ok=True)
+    wordcloud_paths = []
+    to_render = []
+    for aspect, frequencies in term_frequencies(teacher_df, aspect_categories).items():
+        image_path = wordcloud_image_path(frequencies)
+        wordcloud_paths.append((aspect, image_path))
+        if not os.path.exists(image_path):
+            to_render.append((dict(frequencies), image_path))
+
+    if len(to_render) == 1 or mp.parent_process() is not None:
+        # Inside a worker process (e.g. the bulk exporter) the caller already runs in parallel
+        for frequencies, image_path in to_render:
+            render_wordcloud(frequencies, image_path)
+    elif to_render:
+        # Layout is CPU bound, so aspects render side by side in separate processes
+        try:
+            list(_get_render_pool().map(render_wordcloud, *zip(*to_render)))
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time and finish this batch here
+            _render_pool = None
+            for frequencies, image_path in to_render:
+                render_wordcloud(frequencies, image_path)
+    return wordcloud_paths